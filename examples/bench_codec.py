@@ -0,0 +1,96 @@
+# Copyright (c) 2012, Johan Rydberg
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Micro-benchmark of the wire codecs.
+
+Encodes and decodes typical call and cast payloads with every
+registered codec, both inline and as wire frames with binaries as
+attachments, and with the JSON hooks that messages used to go through
+before the codec registry.
+"""
+
+from pyact import actor, codec
+import time
+import uuid
+
+ROUNDS = 20000
+
+ADDRESS = actor.Address('cookie@localhost.local:3232', str(uuid.uuid1()))
+
+PAYLOADS = {
+    'call': {'call': str(uuid.uuid1()), 'method': 'lookup',
+             'address': ADDRESS, 'message': {'key': 'user:1234'}},
+    'response': {'response': str(uuid.uuid1()),
+                 'message': {'name': 'Jane', 'age': 42,
+                             'tags': ['a', 'b', 'c']}},
+    'cast': {'event': 'update', 'from': ADDRESS,
+             'data': [{'id': i, 'value': i * 0.5} for i in range(20)]},
+    'binary': {'blob': actor.Binary('\x00\xff' * 32768), 'from': ADDRESS},
+}
+
+
+class Legacy(object):
+    name = 'json (hooks)'
+
+    def encode(self, message):
+        return actor.json.dumps(message, default=actor.handle_custom)
+
+    def decode(self, data):
+        return actor.json.loads(data, object_hook=actor.generate_custom)
+
+
+class Framed(object):
+
+    def __init__(self, wire):
+        self.wire = wire
+        self.name = wire.name + ' (frames)'
+
+    def encode(self, message):
+        return ''.join(str(frame) if isinstance(frame, str)
+                       else frame.tobytes()
+                       for frame in self.wire.encode_frames(message))
+
+    def decode(self, data):
+        return self.wire.decode_frames(data)
+
+
+def bench(wire, message):
+    start = time.time()
+    for i in xrange(ROUNDS):
+        data = wire.encode(message)
+    encoded = time.time() - start
+    start = time.time()
+    for i in xrange(ROUNDS):
+        wire.decode(data)
+    return len(data), encoded, time.time() - start
+
+
+wires = [Legacy()]
+for name in codec.available():
+    wires.extend([codec.get(name), Framed(codec.get(name))])
+print "%-10s %-17s %7s %10s %10s" % (
+    'payload', 'codec', 'bytes', 'encode', 'decode')
+for payload, message in sorted(PAYLOADS.items()):
+    for wire in wires:
+        size, encoded, decoded = bench(wire, message)
+        print "%-10s %-17s %7d %9.3fs %9.3fs" % (
+            payload, wire.name, size, encoded, decoded)
@@ -0,0 +1,81 @@
+# Copyright (c) 2012, Johan Rydberg
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Micro-benchmark of selective receive matching.
+
+Matches a stream of tagged tuples and dicts against a growing number
+of patterns, first by testing every pattern in turn with
+`shape.is_shaped`, then with a single `shape.compile_many` net.
+"""
+
+from pyact import shape
+import time
+
+ROUNDS = 20000
+
+
+def patterns(n):
+    result = []
+    for i in range(n):
+        if i % 2:
+            result.append(('tag%d' % i, str, int))
+        else:
+            result.append({'event': 'tag%d' % i, 'data': object})
+    return tuple(result)
+
+
+def messages(n):
+    result = []
+    for i in range(n):
+        if i % 2:
+            result.append(('tag%d' % i, 'data', i))
+        else:
+            result.append({'event': 'tag%d' % i, 'data': i})
+    return result
+
+
+def sequential(pats, things):
+    for thing in things:
+        for pattern in pats:
+            if shape.is_shaped(thing, pattern):
+                break
+
+
+def discriminated(pats, things):
+    select = shape.compile_many(pats)
+    for thing in things:
+        select(thing)
+
+
+def bench(fn, pats, things):
+    start = time.time()
+    for i in range(ROUNDS // len(things)):
+        fn(pats, things)
+    return time.time() - start
+
+
+print "%8s %12s %12s %8s" % ('patterns', 'sequential', 'net', 'speedup')
+for n in (1, 2, 4, 8, 16, 32, 64):
+    pats, things = patterns(n), messages(n)
+    slow = bench(sequential, pats, things)
+    fast = bench(discriminated, pats, things)
+    print "%8d %11.3fs %11.3fs %7.1fx" % (n, slow, fast, slow / fast)
@@ -0,0 +1,60 @@
+# Copyright (c) 2012, Johan Rydberg
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Benchmark of receive timeouts.
+
+Spawns a large number of idle actors that sit in a loop receiving
+with a short timeout, which is the common pattern for actors that do
+periodic housekeeping.  The number of timeouts served per second is
+reported; all of them are driven by the node's shared timer wheel.
+"""
+
+from pyact import actor
+import gevent
+import time
+
+ACTORS = 10000
+TIMEOUT = 0.05
+DURATION = 5.0
+
+
+def idle(receive, counts):
+    deadline = time.time() + DURATION
+    while time.time() < deadline:
+        pat, msg = receive(timeout=TIMEOUT)
+        counts[0] += 1
+
+
+def run(receive, n):
+    counts = [0]
+    start = time.time()
+    actors = [actor.spawn(idle, counts) for i in range(n)]
+    gevent.sleep(DURATION + 1)
+    elapsed = time.time() - start
+    print "%d actors, %d timeouts in %.3fs, %d timeouts/s" % (
+        n, counts[0], elapsed, counts[0] / elapsed)
+
+
+mesh = actor.Mesh()
+node = actor.Node(mesh, 'cookie@localhost.local:3232')
+addr = node.spawn(run, ACTORS)
+node.wait(addr)
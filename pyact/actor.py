@@ -21,7 +21,13 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import uuid
+from collections import deque
+import copy
+import itertools
+import numbers
+import random
+import sys
+import time
 import weakref
 
 try:
@@ -32,9 +38,12 @@ except ImportError:
 from gevent import Greenlet, Timeout, local, core
 from gevent.event import Event
 from gevent.hub import GreenletExit
+from gevent.pool import Pool
 import gevent
 
-from pyact import exc, shape
+from pyact import cache, codec, exc, mailbox, shape, timer
+from pyact.codec import Binary
+from pyact.record import Record
 
 
 class ActorError(RuntimeError):
@@ -53,8 +62,12 @@ class DeadActor(ActorError):
     """
 
 
-class ReceiveTimeout(ActorError):
-    """Internal exception used to signal receive timeouts.
+class MailboxFull(ActorError):
+    """Exception which is raised to the sender of a message when the
+    receiving Actor's mailbox is full and its overflow policy is RAISE.
+
+    The arguments are the addresses of the Actors that did not get the
+    message; there may be several of them for a multicast.
     """
 
 
@@ -71,6 +84,16 @@ class RemoteException(ActorError):
     pass
 
 
+# Overflow policies for bounded mailboxes.
+BLOCK, DROP_NEWEST, DROP_OLDEST, RAISE = (
+    'block', 'drop_newest', 'drop_oldest', 'raise')
+OVERFLOW_POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST, RAISE)
+
+# Isolation policies for messages sent within a process.
+JSON, DEEPCOPY, FREEZE, TRUSTED = 'json', 'deepcopy', 'freeze', 'trusted'
+ISOLATION_POLICIES = (JSON, DEEPCOPY, FREEZE, TRUSTED)
+
+
 def build_call_pattern(method,message=object):
     call_pat = CALL_PATTERN.copy()
     call_pat['method'] = method
@@ -157,9 +180,27 @@ def spawn_link(spawnable, *args, **kw):
     return curactor().spawn_link(spawnable, *args, **kw)
 
 
+def send_after(delay, address, message):
+    """Send C{message} to C{address} after C{delay} seconds.
+
+    All scheduled messages of a node are delivered by one scheduler.
+    Return a handle with a C{cancel} method.
+    """
+    return curactor().send_after(delay, address, message)
+
+
+def send_interval(interval, address, message):
+    """Send C{message} to C{address} every C{interval} seconds until
+    the returned handle is cancelled.
+    """
+    return curactor().send_interval(interval, address, message)
+
+
 def handle_custom(obj):
-    if isinstance(obj, Address):
+    if isinstance(obj, (Address, Binary)):
         return obj.to_json()
+    elif hasattr(obj, '_as_json_obj'):
+        return obj._as_json_obj()
     raise TypeError(obj)
 
 
@@ -167,9 +208,68 @@ def generate_custom(obj):
     address = Address.from_json(obj)
     if address:
         return address
+    binary = Binary.from_json(obj)
+    if binary is not None:
+        return binary
+    return obj
+
+
+class FrozenDict(dict):
+    """A dict that cannot be modified, see L{freeze}."""
+
+    __slots__ = ()
+
+    def _immutable(self, *args, **kw):
+        raise TypeError("frozen message cannot be modified")
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __hash__(self):
+        return hash(frozenset(self.iteritems()))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(obj):
+    """Return a recursively immutable version of C{obj}.
+
+    Lists and tuples become tuples, dicts become L{FrozenDict}s,
+    sets become frozensets, records become frozen records and
+    L{Binary} values are made immutable.  Other objects are returned
+    as they are.  Note that a frozen list no longer matches a list
+    shape.
+    """
+    obj_type = type(obj)
+    if obj_type is dict:
+        return FrozenDict((key, freeze(value))
+                          for key, value in obj.iteritems())
+    elif obj_type is list or obj_type is tuple:
+        return tuple(freeze(item) for item in obj)
+    elif obj_type is set:
+        return frozenset(obj)
+    elif obj_type is Binary:
+        return obj.immutable()
+    elif isinstance(obj, Record):
+        return obj.frozen(freeze)
     return obj
 
 
+def _trusted(message):
+    return message
+
+
+# Live addresses by node id and actor id, see Address.
+_addresses = {}
+
+
 class Address(object):
     """An Address is a reference to another Actor.
 
@@ -179,15 +279,46 @@ class Address(object):
 
     Note that an Address instance itself is rather useless.  You need
     node or a mesh to actually send a message.
+
+    Addresses are interned: as long as an address is alive, creating
+    or decoding another one for the same actor returns it.  Addresses
+    compare equal by node id and actor id.
     """
 
-    def __init__(self, node_id, actor_id):
-        self._node_id = node_id
-        self._actor_id = actor_id
+    __slots__ = ('_node_id', '_actor_id', '__weakref__')
+
+    def __new__(cls, node_id, actor_id):
+        addresses = _addresses.get(node_id)
+        if addresses is None:
+            addresses = _addresses[node_id] = weakref.WeakValueDictionary()
+        address = addresses.get(actor_id)
+        if address is None:
+            address = object.__new__(cls)
+            address._node_id = node_id
+            address._actor_id = actor_id
+            addresses[actor_id] = address
+        return address
 
     actor_id = property(lambda self: self._actor_id)
     node_id = property(lambda self: self._node_id)
 
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Address)
+                                 and self._actor_id == other._actor_id
+                                 and self._node_id == other._node_id)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._actor_id) ^ hash(self._node_id)
+
+    def __repr__(self):
+        return 'Address(%r, %r)' % (self._node_id, self._actor_id)
+
+    def __reduce__(self):
+        return (Address, (self._node_id, self._actor_id))
+
     def to_json(self):
         return {'_pyact_actor_id': self._actor_id,
                 '_pyact_node_id': self._node_id}
@@ -198,9 +329,31 @@ class Address(object):
             return Address(obj['_pyact_node_id'], obj['_pyact_actor_id'])
         return None
 
-    def cast(self, message):
-        """Send a message to the Actor this object addresses."""
-        curactor().send(self, message)
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def cast(self, message, urgent=False, trace_id=None):
+        """Send a message to the Actor this object addresses.
+
+        If C{urgent} is true the message is put in the urgent lane of
+        the receiving Actor's mailbox, which receive looks at first.
+        C{trace_id} is passed on in the envelope of the message.
+        """
+        curactor().send(self, message, urgent, trace_id)
+
+    @classmethod
+    def cast_many(cls, addresses, message, urgent=False, trace_id=None):
+        """Send the same message to all of the given addresses.
+
+        This is cheaper than casting to each of them, since the
+        message is only serialized once.  If some of the receivers
+        have a full mailbox, the others still get the message and
+        L{MailboxFull} is raised afterwards with their addresses.
+        """
+        curactor().multicast(addresses, message, urgent, trace_id)
 
     def __or__(self, message):
         """Use Erlang-y syntax (| instead of !) to send messages.
@@ -219,36 +372,33 @@ class Address(object):
         This could have nicer syntax somehow to make it look like an
         actual method call.
         """
-        message_id = str(uuid.uuid1())
-        my_address = curaddr()
-
-        self.cast(
-                {'call': message_id, 'method': method,
-                'address': my_address, 'message': message})
-
-        if timeout is None:
-            cancel = None
-        else:
-            # Raise any TimeoutError to the caller so they can handle
-            # it.
-            cancel = gevent.Timeout(timeout)
-            cancel.start()
-
-        RSP = {'response': message_id, 'message': object}
-        EXC = {'response': message_id, 'exception': object}
-        INV = {'response': message_id, 'invalid_method': str}
-
-        pattern, response = curactor().receive(RSP, EXC, INV)
-
-        if cancel is not None:
-            cancel.cancel()
+        future = self.call_async(method, message)
+        try:
+            return future.result(timeout)
+        finally:
+            future.cancel()
 
-        if pattern is INV:
-            raise RemoteAttributeError(method)
-        elif pattern is EXC:
-            raise RemoteException(response)
+    def call_async(self, method, message=None):
+        """Send a call to the Actor this object addresses, and return
+        a L{Future} for its result without waiting for it.
 
-        return response['message']
+        The reply does not go through the mailbox of the caller; it is
+        handed straight to the future, see L{Actor._cast}.  Wait for
+        one or more futures with L{Future.result}, L{gather} or
+        L{as_completed}.
+        """
+        current = curactor()
+        message_id = current.node._new_id()
+        future = current._replies[message_id] = Future(current, message_id,
+                                                       method)
+        try:
+            self.cast(
+                    {'call': message_id, 'method': method,
+                    'address': current.address, 'message': message})
+        except:
+            future.cancel()
+            raise
+        return future
 
     def __getattr__(self, method):
         """Support address.<method>(message, timout) call pattern.
@@ -256,11 +406,107 @@ class Address(object):
         For example:
               addr.call('test') could be written as addr.test()
         """
+        if method.startswith('__'):
+            # Protocol lookups, such as copy's __deepcopy__.
+            raise AttributeError(method)
         f = lambda message=None, timeout=None: self.call(
             method, message, timeout)
         return f
 
 
+class Future(object):
+    """The result of a call made with L{Address.call_async}.
+
+    The future is resolved by the reply to the call when it is handed
+    to the calling Actor, so only that Actor can wait for it.
+    """
+
+    __slots__ = ('_actor', '_call_id', '_method', '_pattern', '_response')
+
+    def __init__(self, actor, call_id, method):
+        self._actor = actor
+        self._call_id = call_id
+        self._method = method
+        self._pattern = None
+        self._response = None
+
+    def done(self):
+        """Return True if the reply has arrived."""
+        return self._pattern is not None
+
+    def result(self, timeout=None):
+        """Wait for the reply and return the result of the call.
+
+        Raise L{RemoteException} if the call raised an exception, and
+        L{RemoteAttributeError} if the method does not exist.  Raise
+        C{gevent.Timeout} if no reply arrives in C{timeout} seconds;
+        the future can still be waited for again.
+        """
+        if self._pattern is None:
+            self._actor._await_replies((self,), _deadline(timeout))
+        if self._pattern is INVALID_METHOD_PATTERN:
+            raise RemoteAttributeError(self._method)
+        elif self._pattern is EXCEPTION_PATTERN:
+            raise RemoteException(self._response)
+        return self._response['message']
+
+    def cancel(self):
+        """Stop waiting for the reply.  A reply that arrives later is
+        discarded, see L{Actor.late_replies}.
+        """
+        if self._actor._replies.pop(self._call_id, None) is not None:
+            self._actor._abandon(self._call_id)
+
+    def _resolve(self, pattern, response):
+        self._pattern = pattern
+        self._response = response
+
+
+def _deadline(timeout):
+    if timeout is None:
+        return None
+    return time.time() + timeout
+
+
+def gather(futures, timeout=None):
+    """Wait for all of the given futures and return their results, in
+    order.
+
+    The calls are already under way, so this takes as long as the
+    slowest of them.  If a call failed, its exception is raised once
+    all replies are in.  Raise C{gevent.Timeout} if they are not in
+    within C{timeout} seconds.
+    """
+    futures = list(futures)
+    current = curactor()
+    deadline = _deadline(timeout)
+    pending = [future for future in futures if not future.done()]
+    while pending:
+        current._await_replies(pending, deadline)
+        pending = [future for future in pending if not future.done()]
+    return [future.result() for future in futures]
+
+
+def as_completed(futures, timeout=None):
+    """Yield the given futures as their replies arrive.
+
+    Raise C{gevent.Timeout} if not all of them are done within
+    C{timeout} seconds.
+    """
+    current = curactor()
+    deadline = _deadline(timeout)
+    pending = list(futures)
+    while pending:
+        current._await_replies(pending, deadline)
+        remaining = []
+        for future in pending:
+            if future.done():
+                yield future
+            else:
+                remaining.append(future)
+        pending = remaining
+
+
 class _Greenlet(Greenlet):
     """Private version of the greenlet that doesn't dump a stacktrace
     to stderr when a greenlet dies.
@@ -278,15 +524,16 @@ class _Greenlet(Greenlet):
             self._notifier = core.active_event(self._notify_links)
 
 
-CALL_PATTERN = {'call': str, 'method': str, 'address': Address,
+# Ids are integers, but can be longs where a C long has 32 bits.
+CALL_PATTERN = {'call': numbers.Integral, 'method': str, 'address': Address,
                 'message': object}
 REMOTE_CALL_PATTERN = {'remotecall':str,
                        'method':str,
                        'message':object,
                        'timeout':object}
-RESPONSE_PATTERN = {'response': str, 'message': object}
-INVALID_METHOD_PATTERN = {'response': str, 'invalid_method': str}
-EXCEPTION_PATTERN = {'response': str, 'exception':object}
+RESPONSE_PATTERN = {'response': numbers.Integral, 'message': object}
+INVALID_METHOD_PATTERN = {'response': numbers.Integral, 'invalid_method': str}
+EXCEPTION_PATTERN = {'response': numbers.Integral, 'exception':object}
 
 
 class Actor(object):
@@ -309,26 +556,70 @@ class Actor(object):
     Since multiple patterns may be passed to receive, the return value
     is (matched_pattern, message). To receive any message which is in
     the mailbox, simply call receive with no patterns.
+
+    Messages sent as urgent, such as call responses, go to a separate
+    lane of the mailbox that receive searches first.  Within each lane
+    messages are received in arrival order.
+
+    The mailbox is unbounded unless C{max_mailbox} is set, either on
+    the class or when spawning the Actor.  A message sent to a full
+    mailbox is handled according to C{overflow}: BLOCK makes the
+    sender wait until there is room, DROP_NEWEST discards the message,
+    DROP_OLDEST discards the oldest queued message, and RAISE raises
+    L{MailboxFull} to the sender.  Urgent messages are not bounded.
+
+    Replies to calls that were given up on, for instance because they
+    timed out, are discarded when they arrive and counted in
+    C{late_replies}.  The ids of the last C{max_abandoned_calls} such
+    calls are remembered.
     """
 
-    _wevent = None
     _args = (), {}
+    _space = None
+
+    max_mailbox = None
+    overflow = BLOCK
+    max_abandoned_calls = 1024
 
     actor_id = property(lambda self: self._actor_id)
     dead = property(lambda self: self.greenlet.ready())
+    mailbox_high_water = property(lambda self: self._mailbox.high_water)
+    late_replies = property(lambda self: self._late_replies)
 
-    def __init__(self, run=None, node=None, mesh=None):
+    def __init__(self, run=None, node=None, mesh=None, max_mailbox=None,
+                 overflow=None):
         if run is None:
             self._to_run = self.main
         else:
             self._to_run = lambda *args, **kw: run(self.receive, *args, **kw)
-        self._actor_id = str(uuid.uuid1())
+        self._actor_id = node._new_id()
         self.greenlet = _Greenlet(self._run)
         self.start = self.greenlet.start
         self.start_later = self.greenlet.start_later
         self.node = node
         self.mesh = mesh
-        self._mailbox = []
+        self._mailbox = mailbox.Mailbox()
+        # Control and reply traffic, received before the mailbox.
+        self._urgent = mailbox.Mailbox()
+        # Set when a message arrives; shared by all receives.
+        self._wakeup = Event()
+        # Futures of pending calls, by call id.
+        self._replies = {}
+        # Set when a reply resolves one of them.
+        self._replied = Event()
+        # Ids of calls given up on, oldest first in _abandoned_order.
+        self._abandoned = set()
+        self._abandoned_order = deque()
+        self._late_replies = 0
+        if max_mailbox is not None:
+            self.max_mailbox = max_mailbox
+        if overflow is not None:
+            self.overflow = overflow
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError("unknown overflow policy %r" % (self.overflow,))
+        if self.max_mailbox is not None and self.overflow == BLOCK:
+            # Set when a message is taken out of a bounded mailbox.
+            self._space = Event()
         self.address = Address(node.id, self._actor_id)
 
     def spawn(self, spawnable, *args, **kw):
@@ -373,62 +664,163 @@ class Actor(object):
         to_run = self._to_run
         del self._to_run
         _setcurrent(self)
-        return to_run(*args, **kw)
+        try:
+            return to_run(*args, **kw)
+        finally:
+            if self._space is not None:
+                # Release senders blocked on our mailbox.
+                self._space.set()
 
-    def _match_patterns(self,patterns):
+    def _match_patterns(self, patterns, after=(0, 0), with_envelope=False):
         """Internal method to match a list of patterns against
         the mailbox. If message matches any of the patterns,
         that message is removed from the mailbox and returned
         along with the pattern it matched. If message doesn't
         match any pattern then None,None is returned.
+
+        The urgent lane is searched before the normal one.  Only
+        messages that arrived after the (urgent, normal) mailbox
+        positions in C{after} are tested.
         """
-        for i, message in enumerate(self._mailbox):
-            for pattern in patterns:
-                if shape.is_shaped(message, pattern):
-                    del self._mailbox[i]
-                    return pattern, message
-        return None,None
+        urgent_after, after = after
+        matched = self._urgent.select(patterns, urgent_after, with_envelope)
+        if matched[0] is None:
+            matched = self._mailbox.select(patterns, after, with_envelope)
+        return matched
+
+    def _take(self, lane, with_envelope):
+        """Take the oldest message out of a mailbox lane, the way
+        receive returns it when no patterns are given.
+        """
+        if with_envelope:
+            return ({object: object},) + lane.popleft(True)
+        return {object: object}, lane.popleft()
 
     def receive(self, *patterns, **kw):
         """Select a message out of this Actor's mailbox. If patterns
         are given, only select messages which match these shapes.
         Otherwise, select the next message.
+
+        If C{with_envelope} is true, return a (pattern, message,
+        envelope) tuple, where the L{mailbox.Envelope} tells who sent
+        the message, when it was queued and its trace id.
         """
         timeout = kw.get('timeout', None)
-        if timeout == 0 :
-            if not patterns:
-                if self._mailbox:
-                    return {object: object}, self._mailbox.pop(0)
-                else:
-                    return None,None
-            return self._match_patterns(patterns)
+        with_envelope = kw.get('with_envelope', False)
         if timeout is not None:
-            timer = gevent.Timeout(timeout, ReceiveTimeout)
-            timer.start()
-        else:
-            timer = None
+            deadline = time.time() + timeout
+        # Mailbox positions up to which messages have been tested
+        # against the patterns without a match.
+        cursor = (0, 0)
+        wakeup = self._wakeup
+        alarm = None
         try:
             while True:
+                wakeup.clear()
                 if patterns:
-                    matched_pat, matched_msg = self._match_patterns(patterns)
+                    matched = self._match_patterns(patterns, cursor,
+                                                   with_envelope)
+                    cursor = (self._urgent.last, self._mailbox.last)
+                elif self._urgent:
+                    matched = self._take(self._urgent, with_envelope)
                 elif self._mailbox:
-                    matched_pat, matched_msg = ({object:object},
-                                                self._mailbox.pop(0))
+                    matched = self._take(self._mailbox, with_envelope)
+                else:
+                    matched = (None,)
+                if matched[0] is not None:
+                    if self._space is not None:
+                        self._space.set()
+                    return matched
+
+                # wait until at least one message or timeout
+                if timeout is None:
+                    wakeup.wait()
                 else:
-                    matched_pat = None
-                if matched_pat is not None:
-                    if timer:
-                        timer.cancel()
-                    return matched_pat, matched_msg
+                    remaining = deadline - time.time()
+                    if timeout == 0 or remaining <= 0:
+                        if with_envelope:
+                            return (None, None, None)
+                        return (None, None)
+                    alarm = self._wait(remaining, alarm)
+        finally:
+            if alarm is not None:
+                alarm.cancel()
 
-                self._wevent = Event()
-                try:
-                    # wait until at least one message or timeout
-                    self._wevent.wait()
-                finally:
-                    self._wevent = None
-        except ReceiveTimeout:
-            return (None,None)
+    def _wait(self, remaining, alarm):
+        """Wait until a message arrives or C{remaining} seconds have
+        passed.
+
+        The timeout is served by the node's timer wheel.  The alarm is
+        returned so that following waits of the same receive can reuse
+        it while it is pending; the caller cancels it when done.
+        """
+        if alarm is None or not alarm.pending:
+            alarm = self.node.call_later(remaining, self._wakeup.set)
+        self._wakeup.wait()
+        return alarm
+
+    def receive_batch(self, *patterns, **kw):
+        """Select up to C{max_items} messages out of this Actor's
+        mailbox and return them as a list of (pattern, message)
+        tuples.  Patterns work as for L{receive}.
+
+        Wait, at most C{timeout} seconds if given, for a first message
+        and then take every other matching message already queued.
+        If C{linger} is given, keep collecting messages that arrive
+        within that many seconds, until C{max_items} is reached.  An
+        empty list is returned if the timeout expires.
+
+        C{with_envelope} adds envelopes to the tuples as for
+        L{receive}.
+        """
+        max_items = kw.get('max_items', None)
+        linger = kw.get('linger', None)
+        with_envelope = kw.get('with_envelope', False)
+        matched = self.receive(*patterns, timeout=kw.get('timeout', None),
+                               with_envelope=with_envelope)
+        if matched[0] is None:
+            return []
+        batch = [matched]
+        if linger:
+            deadline = time.time() + linger
+        cursor = (0, 0)
+        wakeup = self._wakeup
+        alarm = None
+        try:
+            while max_items is None or len(batch) < max_items:
+                wakeup.clear()
+                self._drain(patterns, cursor, max_items, batch,
+                            with_envelope)
+                cursor = (self._urgent.last, self._mailbox.last)
+                if not linger:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                alarm = self._wait(remaining, alarm)
+        finally:
+            if alarm is not None:
+                alarm.cancel()
+        if self._space is not None:
+            self._space.set()
+        return batch
+
+    def _drain(self, patterns, after, max_items, batch, with_envelope=False):
+        """Move messages matching patterns from both mailbox lanes
+        to batch, until it holds max_items messages.
+        """
+        for lane, lane_after in zip((self._urgent, self._mailbox), after):
+            if max_items is None:
+                limit = None
+            else:
+                limit = max_items - len(batch)
+            if patterns:
+                batch.extend(lane.select_many(patterns, lane_after, limit,
+                                              with_envelope))
+            else:
+                batch.extend(({object: object},) + matched[1:]
+                             for matched in lane.select_many(
+                                 (object,), lane_after, limit, with_envelope))
 
     def link(self):
         """Link the Actor at the given Address to this Actor.
@@ -460,18 +852,224 @@ class Actor(object):
     def sleep(self, amount):
         gevent.sleep(amount)
 
-    def send(self, address, message):
-        """Send a message to the given address."""
-        self.mesh.cast(address, json.dumps(message, default=handle_custom))
+    def send_after(self, delay, address, message, urgent=False,
+                   trace_id=None):
+        """Send a message to the given address after C{delay} seconds.
+
+        Return a handle whose C{cancel} method withdraws the message,
+        see L{Node.send_after}.
+        """
+        return self.node.send_after(delay, address, message, urgent,
+                                    self.address, trace_id)
+
+    def send_interval(self, interval, address, message, urgent=False,
+                      trace_id=None):
+        """Send a message to the given address every C{interval}
+        seconds until the returned handle is cancelled.
+        """
+        return self.node.send_interval(interval, address, message, urgent,
+                                       self.address, trace_id)
+
+    def send(self, address, message, urgent=False, trace_id=None):
+        """Send a message to the given address.
 
-    def _cast(self, message):
+        Urgent messages are received before other messages, see
+        L{Actor}.  The envelope of the message names this Actor as
+        the sender and carries C{trace_id}, see L{receive}.
+        """
+        self.node.send(address, message, urgent, self.address, trace_id)
+
+    def multicast(self, addresses, message, urgent=False, trace_id=None):
+        """Send the same message to all of the given addresses,
+        serializing it only once, see L{Node.multicast}.
+        """
+        self.node.multicast(addresses, message, urgent, self.address,
+                            trace_id)
+
+    def _overflow(self, block=True):
+        """Apply the overflow policy to a full mailbox.
+
+        Return False if the incoming message should be dropped.  If
+        C{block} is false, a L{BLOCK} policy drops the message instead
+        of waiting for room.
+        """
+        if self.overflow == DROP_NEWEST:
+            return False
+        elif self.overflow == DROP_OLDEST:
+            self._mailbox.popleft()
+            return True
+        elif (self.overflow == RAISE
+              or gevent.getcurrent() is self.greenlet):
+            # An actor blocking on its own mailbox would never wake up.
+            raise MailboxFull(self.address)
+        elif not block:
+            return False
+        while len(self._mailbox) >= self.max_mailbox:
+            if self.dead:
+                return False
+            self._space.clear()
+            self._space.wait()
+        return True
+
+    def _reply(self, message):
+        """Hand a reply to a pending call to its future.  Return
+        False if the message is no such reply.
+        """
+        if type(message) is codec.LazyMessage:
+            header = message.header
+        else:
+            header = message
+        if not isinstance(header, dict):
+            return False
+        try:
+            call_id = header.get('response')
+            future = self._replies.get(call_id)
+        except TypeError:
+            return False
+        if future is None and call_id not in self._abandoned:
+            return False
+        if header is not message:
+            message = message.decode()
+        index = _select_reply(message)
+        if index < 0:
+            return False
+        if future is None:
+            # A late reply; nobody is waiting for it any more.
+            self._abandoned.discard(call_id)
+            self._late_replies += 1
+            return True
+        del self._replies[call_id]
+        future._resolve(_REPLY_PATTERNS[index], message)
+        self._replied.set()
+        return True
+
+    def _abandon(self, call_id):
+        """Remember that a reply for C{call_id} is to be discarded."""
+        self._abandoned.add(call_id)
+        order = self._abandoned_order
+        order.append(call_id)
+        if len(order) > self.max_abandoned_calls:
+            self._abandoned.discard(order.popleft())
+
+    def _await_replies(self, futures, deadline):
+        """Wait until at least one of the futures is resolved.
+
+        Raise C{gevent.Timeout} if the time C{deadline} passes first.
+        Like receive timeouts, the deadline is served by the node's
+        timer wheel.
+        """
+        replied = self._replied
+        alarm = None
+        try:
+            while True:
+                replied.clear()
+                for future in futures:
+                    if future._pattern is not None:
+                        return
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise gevent.Timeout()
+                    if alarm is None or not alarm.pending:
+                        alarm = self.node.call_later(remaining, replied.set)
+                replied.wait()
+        finally:
+            if alarm is not None:
+                alarm.cancel()
+
+    def _cast(self, message, urgent=False, sender=None, trace_id=None,
+              block=True):
         """For internal use.
 
         Nodes uses this to insert a message into this Actor's mailbox.
+        A reply to a call this Actor is waiting for is not queued but
+        handed to the waiting call, and a reply to a call it gave up
+        on is dropped.  See L{_overflow} for C{block}.
         """
-        self._mailbox.append(json.loads(message, object_hook=generate_custom))
-        if self._wevent and not self._wevent.is_set():
-            self._wevent.set()
+        if (self._replies or self._abandoned) and self._reply(message):
+            return
+        if urgent:
+            self._urgent.append(message, mailbox.Envelope(
+                    sender, mailbox.monotonic(), trace_id))
+        elif (self.max_mailbox is not None
+              and len(self._mailbox) >= self.max_mailbox
+              and not self._overflow(block)):
+            return
+        else:
+            self._mailbox.append(message, mailbox.Envelope(
+                    sender, mailbox.monotonic(), trace_id))
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+
+_is_call_message = shape.compile(CALL_PATTERN)
+_REPLY_PATTERNS = (RESPONSE_PATTERN, EXCEPTION_PATTERN,
+                   INVALID_METHOD_PATTERN)
+_select_reply = shape.compile_many(_REPLY_PATTERNS)
+
+
+codec.get(codec.JSON).register_type(
+    Address, '_pyact_address',
+    lambda address: [address.node_id, address.actor_id],
+    lambda value: Address(*value))
+if codec.MSGPACK in codec.available():
+    codec.get(codec.MSGPACK).register_type(
+        Address, 1,
+        lambda address: (address.node_id, address.actor_id),
+        lambda value: Address(*value))
+
+
+def memoize(maxsize=128, ttl=None, invalidate=None):
+    """Decorate a L{Server} method to cache its results.
+
+    Results are cached by the encoded call message, in an
+    L{cache.LRUCache} of C{maxsize} entries that expire after C{ttl}
+    seconds, if given.  A hit is responded to without calling the
+    method.  If C{invalidate} is a pattern, any message matching it
+    that is sent to the server clears the cache.
+    """
+    def decorate(method):
+        method.memoize = {'maxsize': maxsize, 'ttl': ttl,
+                          'invalidate': invalidate}
+        return method
+    return decorate
+
+
+def batched(max_items=100, linger=0.01):
+    """Decorate a L{Server} method to be called with a list of call
+    arguments rather than one.
+
+    The server collects the calls to the method for up to C{linger}
+    seconds after the first one arrives, or until there are
+    C{max_items} of them, and then calls the method once with their
+    arguments.  The method returns a list with a result for each
+    argument, which is sent back to the caller that passed it.
+    """
+    def decorate(method):
+        method.batched = {'max_items': max_items, 'linger': linger}
+        return method
+    return decorate
+
+
+_MISS = object()
+
+
+def _canonical(message):
+    """Return C{message} with its dicts replaced by their items in
+    sorted order, so that equal messages encode the same way whatever
+    order their dicts were built in.
+    """
+    message_type = type(message)
+    if message_type is dict or message_type is FrozenDict:
+        items = sorted(message.iteritems())
+        return {'_pyact_items': [[_canonical(key), _canonical(value)]
+                                 for key, value in items]}
+    elif message_type is list or message_type is tuple:
+        return [_canonical(item) for item in message]
+    elif isinstance(message, Record):
+        return message_type.from_values([_canonical(value)
+                                         for value in message.values()])
+    return message
 
 
 class Server(Actor):
@@ -480,25 +1078,55 @@ class Server(Actor):
 
     Also, Server provides start and stop methods which can be overridden
     to customize setup.
+
+    By default calls are handled one at a time.  If C{max_concurrency}
+    is more than one, each call is handled in a greenlet of its own,
+    up to that many at a time; the server stops taking calls out of
+    its mailbox while all of them are busy.  Calls to the methods
+    named in C{serial_methods} are still handled one at a time, in
+    arrival order.  Handlers run as the server Actor, so they can make
+    calls, but should not receive from the mailbox.
+
+    Methods decorated with L{memoize} have their results cached.  The
+    caches are in C{caches}, by method name, and count their hits and
+    misses.
+
+    Calls to memoized methods and to the methods named in
+    C{coalesce_methods} are coalesced: a call that arrives while an
+    identical call (same method, equal message) is being handled does
+    not run the method again, but gets the result of the running call.
+    C{coalesced} counts such calls.  This only makes a difference when
+    calls are handled concurrently.
+
+    Methods decorated with L{batched} handle the calls collected over
+    a short time with one invocation.  They are not memoized,
+    coalesced or serial.
     """
 
+    max_concurrency = 1
+    serial_methods = ()
+    coalesce_methods = ()
+
     def respond(self, orig_message, response=None):
-        if not shape.is_shaped(orig_message, CALL_PATTERN):
+        if not _is_call_message(orig_message):
             raise InvalidCallMessage(str(orig_message))
-        orig_message['address'].cast({'response':orig_message['call'],
-                                      'message':response})
+        self.send(orig_message['address'],
+                  {'response':orig_message['call'], 'message':response},
+                  urgent=True)
 
     def respond_invalid_method(self, orig_message, method):
-        if not shape.is_shaped(orig_message, CALL_PATTERN):
+        if not _is_call_message(orig_message):
             raise InvalidCallMessage(str(orig_message))
-        orig_message['address'].cast({'response':orig_message['call'],
-                                      'invalid_method':method})
+        self.send(orig_message['address'],
+                  {'response':orig_message['call'], 'invalid_method':method},
+                  urgent=True)
 
     def respond_exception(self, orig_message, exception):
-        if not shape.is_shaped(orig_message, CALL_PATTERN):
+        if not _is_call_message(orig_message):
             raise InvalidCallMessage(str(orig_message))
-        orig_message['address'].cast({'response':orig_message['call'],
-                                      'exception':exception})
+        self.send(orig_message['address'],
+                  {'response':orig_message['call'], 'exception':exception},
+                  urgent=True)
 
     def start(self, *args, **kw):
         """Override to be notified when the server starts.
@@ -516,20 +1144,227 @@ class Server(Actor):
         Do not override.
         """
         self.start(*args, **kw)
+        self.caches = {}
+        # (pattern, method name) for the invalidation patterns.
+        invalidations = []
+        # Options of the batched methods, and their collected calls
+        # as (deadline, messages) tuples, by method name.
+        batched_methods, batches = {}, {}
+        for name in dir(type(self)):
+            attribute = getattr(type(self), name, None)
+            options = getattr(attribute, 'batched', None)
+            if isinstance(options, dict):
+                batched_methods[name] = options
+                continue
+            options = getattr(attribute, 'memoize', None)
+            if isinstance(options, dict):
+                self.caches[name] = cache.LRUCache(options['maxsize'],
+                                                   options['ttl'])
+                if options['invalidate'] is not None:
+                    invalidations.append((options['invalidate'], name))
+        patterns = (CALL_PATTERN,) + tuple(
+            pattern for pattern, name in invalidations)
+        self._coalesce = set(self.coalesce_methods) | set(self.caches)
+        # Calls waiting for the result of a running call, by method
+        # name and cache key.
+        self._inflight = {}
+        self.coalesced = 0
+        if self.max_concurrency > 1:
+            pool = Pool(self.max_concurrency)
+            # Queued calls to serial methods, by name of those running.
+            self._serial = {}
+        else:
+            pool = None
         try:
             while True:
-                pattern, message = self.receive(CALL_PATTERN)
-                method = getattr(self, message['method'], None)
-                if method is None:
-                    self.respond_invalid_method(message, message['method'])
+                if batches:
+                    timeout = max(0, min(deadline for deadline, messages
+                                         in batches.itervalues())
+                                  - time.time())
+                else:
+                    timeout = None
+                pattern, message = self.receive(*patterns, timeout=timeout)
+                now = time.time()
+                for name, (deadline, messages) in batches.items():
+                    if deadline <= now:
+                        del batches[name]
+                        self._start_batch(pool, name, messages)
+                if pattern is None:
+                    continue
+                elif pattern is not CALL_PATTERN:
+                    for invalidate, name in invalidations:
+                        if shape.compile(invalidate)(message):
+                            self.caches[name].clear()
+                    continue
+                name = message['method']
+                options = batched_methods.get(name)
+                if options is not None:
+                    if name not in batches:
+                        batches[name] = (now + options['linger'], [])
+                    messages = batches[name][1]
+                    messages.append(message)
+                    if len(messages) >= options['max_items']:
+                        del batches[name]
+                        self._start_batch(pool, name, messages)
+                    continue
+                if pool is None:
+                    self._dispatch(message)
                     continue
+                if name in self._serial:
+                    self._serial[name].append(message)
+                    continue
+                if name in self.serial_methods:
+                    self._serial[name] = deque()
+                pool.spawn(self._handle, message)
+        finally:
+            self._abandon_batches(batches)
+            if pool is not None:
+                pool.kill()
+            self.stop(*args, **kw)
+
+    def clear_cache(self, name=None):
+        """Clear the result cache of the memoized method C{name}, or of
+        all memoized methods.
+        """
+        if name is None:
+            for method_cache in self.caches.values():
+                method_cache.clear()
+        else:
+            self.caches[name].clear()
+
+    def _cache_key(self, message):
+        """Return the cache key for the argument of a call, or None if
+        it can not be encoded.  Equal arguments have the same key.
+
+        Encoding may fail in many ways for messages that were passed
+        by reference, such as byte strings that are not UTF-8 or
+        circular structures, so any error makes the call uncacheable.
+        """
+        try:
+            return self.node.codec.encode(_canonical(message))
+        except Exception:
+            return None
+
+    def _dispatch(self, message):
+        """Call the method a call message asks for and respond."""
+        name = message['method']
+        method = getattr(self, name, None)
+        if method is None:
+            self.respond_invalid_method(message, name)
+            return
+        method_cache = self.caches.get(name)
+        key = None
+        if name in self._coalesce:
+            key = self._cache_key(message['message'])
+        if key is None:
+            self._call(method, [message], None)
+            return
+        if method_cache is not None:
+            result = method_cache.get(key, _MISS)
+            if result is not _MISS:
+                self.respond(message, result)
+                return
+        waiting = self._inflight.get((name, key))
+        if waiting is not None:
+            self.coalesced += 1
+            waiting.append(message)
+            return
+        waiting = self._inflight[(name, key)] = [message]
+        try:
+            self._call(method, waiting, method_cache, key)
+        finally:
+            del self._inflight[(name, key)]
+
+    def _call(self, method, messages, method_cache, key=None):
+        """Call a method once and respond to each of the identical call
+        messages with the result.
+        """
+        try:
+            result = method(messages[0]['message'])
+        except Exception:
+            formatted = exc.format_exc()
+            for message in messages:
+                self.respond_exception(message, formatted)
+            return
+        if method_cache is not None:
+            method_cache.put(key, result)
+        for message in messages:
+            try:
+                self.respond(message, result)
+            except Exception:
+                formatted = exc.format_exc()
+                self.respond_exception(message, formatted)
+
+    def _start_batch(self, pool, name, messages):
+        """Handle the calls collected for a batched method, inline or
+        in a greenlet of the pool.
+        """
+        if pool is None:
+            self._dispatch_batch(name, messages)
+        else:
+            pool.spawn(self._handle_batch, name, messages)
+
+    def _abandon_batches(self, batches):
+        """Respond with an exception to the calls of the batches that
+        were still being collected when the server stopped, so that
+        the callers do not wait for them in vain.
+        """
+        formatted = exc.format_exc((DeadActor, DeadActor(
+                    "server stopped before handling the batch"), None))
+        for deadline, messages in batches.itervalues():
+            for message in messages:
+                self.respond_exception(message, formatted)
+        batches.clear()
+
+    def _handle_batch(self, name, messages):
+        _setcurrent(self)
+        self._dispatch_batch(name, messages)
+
+    def _dispatch_batch(self, name, messages):
+        """Call a batched method with the arguments of the collected
+        calls, and respond to each call with its result.
+        """
+        try:
+            results = getattr(self, name)(
+                [message['message'] for message in messages])
+            if len(results) != len(messages):
+                raise ValueError("%s returned %d results for %d calls" % (
+                        name, len(results), len(messages)))
+        except Exception:
+            formatted = exc.format_exc()
+            for message in messages:
+                self.respond_exception(message, formatted)
+            return
+        for message, result in zip(messages, results):
+            try:
+                self.respond(message, result)
+            except Exception:
+                formatted = exc.format_exc()
+                self.respond_exception(message, formatted)
+
+    def _handle(self, message):
+        """Handle a call in a greenlet of the pool, followed by the
+        calls queued meanwhile if the method is serial.
+
+        A call that fails is answered with an exception response and
+        does not hold up the calls queued behind it, and the method is
+        no longer serialized once the greenlet exits, even if it is
+        killed.
+        """
+        _setcurrent(self)
+        name = message['method']
+        try:
+            while True:
                 try:
-                    self.respond(message,  method(message['message']))
+                    self._dispatch(message)
                 except Exception:
-                    formatted = exc.format_exc()
-                    self.respond_exception(message, formatted)
+                    self.respond_exception(message, exc.format_exc())
+                queued = self._serial.get(name)
+                if not queued:
+                    return
+                message = queued.popleft()
         finally:
-            self.stop(*args, **kw)
+            self._serial.pop(name, None)
 
 
 class Mesh(object):
@@ -551,31 +1386,124 @@ class Mesh(object):
         """Remove a node from the mesh."""
         del self._nodes[id]
 
-    def cast(self, address, message):
+    def cast(self, address, message, urgent=False, sender=None,
+             trace_id=None, block=True):
         """Send a message to a node in the mesh designated by the given
         address.
 
         The message may be silently dropped if the remote node do not
-        exit or if the actor is dead.
+        exit or if the actor is dead.  If C{block} is false, the
+        message is also dropped rather than waiting for room in a full
+        mailbox.
         """
         node = self._nodes.get(address.node_id)
         if node is not None:
-            node._cast(address, message)
+            node._cast(address, message, urgent, sender, trace_id, block)
+
+    def multicast(self, addresses, packed, unpack, urgent=False,
+                  sender=None, trace_id=None):
+        """Send a packed message to many addresses.
+
+        The addresses are grouped by node, and each node is handed
+        the packed message once together with its addresses; C{unpack}
+        makes the copy each actor receives.  Raise L{MailboxFull} with
+        the addresses of the receivers whose mailbox was full once all
+        the others have been sent the message.
+        """
+        by_node = {}
+        for address in addresses:
+            group = by_node.get(address.node_id)
+            if group is None:
+                group = by_node[address.node_id] = []
+            group.append(address)
+        full = []
+        for node_id, group in by_node.iteritems():
+            node = self._nodes.get(node_id)
+            if node is not None:
+                full.extend(node._multicast(group, packed, unpack, urgent,
+                                            sender, trace_id))
+        if full:
+            raise MailboxFull(*full)
 
 
 class Node(object):
-    """Representation of a node in a mesh of nodes."""
+    """Representation of a node in a mesh of nodes.
+
+    C{isolation} decides how a message sent from an actor of the node
+    is kept apart from the sender:
+
+      - C{JSON} encodes and decodes the message with the wire codec
+        of the node, so the receiver sees exactly what a remote node
+        would.  L{Binary} values are not copied; the receiver gets
+        read-only views of them;
+      - C{DEEPCOPY} gives the receiver a deep copy;
+      - C{FREEZE} gives the receiver a recursively immutable copy,
+        see L{freeze};
+      - C{TRUSTED} passes the message by reference; the sender must
+        not modify it afterwards.
+
+    A message is only serialized when it leaves the process, using the
+    codec named by C{wire_codec}, see L{pyact.codec}.
+
+    With C{JSON} isolation, C{lazy_decode} makes messages stay encoded
+    in the mailbox of the receiver until a receive selects them.
+    Patterns are first tested against a small header taken from the
+    message when it was sent, so messages that are never received are
+    never decoded.
+    """
 
     id = property(lambda self: self._id)
 
-    def __init__(self, mesh, id):
+    def __init__(self, mesh, id, isolation=JSON, wire_codec=codec.JSON,
+                 lazy_decode=False):
         """Create a new node."""
+        if isolation not in ISOLATION_POLICIES:
+            raise ValueError("unknown isolation policy %r" % (isolation,))
+        if lazy_decode and isolation != JSON:
+            raise ValueError("lazy_decode requires JSON isolation")
         self._id = id
         self._mesh = mesh
+        self.isolation = isolation
+        self.codec = codec.get(wire_codec)
+        # A message sent to one actor is copied with _isolate.  A
+        # message delivered more than once is packed with _pack once,
+        # and each delivery gets a copy made by _unpack.
+        if lazy_decode:
+            self._isolate = self._pack = self.codec.lazy
+            self._unpack = _trusted
+        elif isolation == JSON:
+            self._isolate = lambda message: self.codec.unpack(
+                self.codec.pack(message))
+            self._pack, self._unpack = self.codec.pack, self.codec.unpack
+        elif isolation == DEEPCOPY:
+            self._isolate = self._pack = self._unpack = copy.deepcopy
+        elif isolation == FREEZE:
+            self._isolate = self._pack = freeze
+            self._unpack = _trusted
+        else:
+            self._isolate = self._pack = self._unpack = _trusted
+        self._timers = timer.TimerWheel()
+        self._ticker = None
+        # Set to wake the ticker up before the time it sleeps until,
+        # when a timer is added that expires earlier.
+        self._ticker_wakeup = Event()
+        self._ticker_until = None
+        # Actor and call ids.  The counter starts at a random multiple
+        # of 2**32, so a node that reuses the id of an earlier one
+        # does not hand out the same ids; ids still fit in 63 bits,
+        # but are longs where a C long has 32 bits.
+        self._ids = itertools.count(int(random.getrandbits(30)) << 32)
         self.actors = weakref.WeakValueDictionary()
         mesh.add(self)
         self.registry = {}
 
+    def _new_id(self):
+        """Return an integer id for an actor or a call, unique to
+        this node.  Together with the id of the node it is unique in
+        the mesh.
+        """
+        return next(self._ids)
+
     def register(self, name, address):
         """Associates the name C{name} with the process C{address}."""
         assert address.node_id == self.id
@@ -601,6 +1529,98 @@ class Node(object):
             raise DeadActor()
         return self.actors[address.actor_id]._get(timeout=timeout)
 
+    def call_later(self, delay, callback, *args):
+        """Call C{callback} with C{args} after C{delay} seconds.
+
+        All timers of the node share one timer wheel that is driven by
+        a single ticker greenlet, which only runs while there are
+        timers pending and sleeps until the next one is due.  Return a
+        L{timer.Timer} that can be cancelled.
+        """
+        t = self._timers.call_later(delay, callback, *args)
+        self._wake_ticker(time.time() + delay)
+        return t
+
+    def call_every(self, interval, callback, *args):
+        """Call C{callback} with C{args} every C{interval} seconds.
+
+        Return a L{timer.Periodic} that can be cancelled.
+        """
+        t = self._timers.call_every(interval, callback, *args)
+        self._wake_ticker(time.time() + interval)
+        return t
+
+    def _wake_ticker(self, when):
+        """Make sure the ticker is awake at time C{when}."""
+        if self._ticker is None:
+            self._ticker = gevent.spawn(self._tick)
+        elif self._ticker_until is not None and when < self._ticker_until:
+            self._ticker_wakeup.set()
+
+    def send_after(self, delay, address, message, urgent=False,
+                   sender=None, trace_id=None):
+        """Send C{message} to C{address} after C{delay} seconds.
+
+        The message is copied when it is scheduled.  Return a handle
+        whose C{cancel} method withdraws the message if it has not
+        been delivered yet.
+        """
+        return self.call_later(delay, self._deliver, address,
+                               self._isolate(message), urgent, sender,
+                               trace_id)
+
+    def send_interval(self, interval, address, message, urgent=False,
+                      sender=None, trace_id=None):
+        """Send C{message} to C{address} every C{interval} seconds
+        until the returned handle is cancelled.
+        """
+        return self.call_every(interval, self._deliver_copy, address,
+                               self._pack(message), urgent, sender,
+                               trace_id)
+
+    def _deliver_copy(self, address, packed, urgent, sender, trace_id):
+        """Deliver a fresh copy of a repeated message."""
+        self._deliver(address, self._unpack(packed), urgent, sender,
+                      trace_id)
+
+    def _deliver(self, address, message, urgent, sender, trace_id):
+        """Deliver a scheduled message.
+
+        This runs in the ticker, which must not block on a full
+        mailbox on any node, so a scheduled message that does not fit
+        is dropped.
+        """
+        try:
+            self._mesh.cast(address, message, urgent, sender, trace_id,
+                            block=False)
+        except MailboxFull:
+            pass
+
+    def _tick(self):
+        """Advance the timer wheel and fire expired timers until there
+        are no pending timers left.  In between, sleep until the next
+        expiry of the wheel, or until an earlier timer is added.
+        """
+        timers, wakeup = self._timers, self._ticker_wakeup
+        try:
+            while timers:
+                wakeup.clear()
+                self._ticker_until = timers.next_expiry()
+                delay = self._ticker_until - time.time()
+                if delay > 0:
+                    wakeup.wait(delay)
+                self._ticker_until = None
+                for t in timers.advance(time.time()):
+                    try:
+                        t.fire()
+                    except Exception:
+                        # Report it as gevent reports errors of
+                        # greenlets, and keep the other timers going.
+                        gevent.get_hub().handle_error(t, *sys.exc_info())
+        finally:
+            self._ticker = None
+            self._ticker_until = None
+
     def spawn(self, spawnable, *args, **kw):
         """Start a new actor.
 
@@ -613,12 +1633,18 @@ class Node(object):
         retrieve messages out of the Actor's mailbox, followed by the
         given *args and **kw.
 
+        The keyword arguments C{max_mailbox} and C{overflow} are not
+        passed on; they bound the new Actor's mailbox, see L{Actor}.
+
         Return the Address of the new Actor.
         """
+        options = {'max_mailbox': kw.pop('max_mailbox', None),
+                   'overflow': kw.pop('overflow', None)}
         if is_actor_type(spawnable):
-            spawnable = spawnable(node=self, mesh=self._mesh)
+            spawnable = spawnable(node=self, mesh=self._mesh, **options)
         else:
-            spawnable = Actor(spawnable, node=self, mesh=self._mesh)
+            spawnable = Actor(spawnable, node=self, mesh=self._mesh,
+                              **options)
 
         # Add the actor to the registry, and have it removed when the
         # actor dies.
@@ -629,12 +1655,53 @@ class Node(object):
         spawnable.start()
         return spawnable.address
 
-    def send(self, address, message):
+    def send(self, address, message, urgent=False, sender=None,
+             trace_id=None):
         """Send a message to an actor on this node or another one.
+
+        The receiver gets a copy made according to the isolation
+        policy of this node.  C{sender} and C{trace_id} are put in the
+        envelope of the message.
+        """
+        self._mesh.cast(address, self._isolate(message), urgent, sender,
+                        trace_id)
+
+    def multicast(self, addresses, message, urgent=False, sender=None,
+                  trace_id=None):
+        """Send the same message to all of the given addresses.
+
+        The message is packed once according to the isolation policy
+        of this node, and each node of the mesh is handed the packed
+        message once for all of its receivers.  Receivers whose
+        mailbox is full do not keep the others from getting the
+        message; L{MailboxFull} is raised with their addresses at the
+        end.
         """
-        self._mesh.cast(address, json.dumps(message, default=handle_custom))
+        self._mesh.multicast(addresses, self._pack(message), self._unpack,
+                             urgent, sender, trace_id)
 
-    def _cast(self, address, message):
+    def _multicast(self, addresses, packed, unpack, urgent=False,
+                   sender=None, trace_id=None):
+        """For internal use.
+
+        Send a packed message to actors on this node.  Each actor
+        gets the copy returned by C{unpack(packed)}.  Return the
+        addresses of the actors whose mailbox was full.
+        """
+        actors = self.actors
+        full = []
+        for address in addresses:
+            _actor = actors.get(address.actor_id)
+            if _actor is None or _actor.dead:
+                continue
+            try:
+                _actor._cast(unpack(packed), urgent, sender, trace_id)
+            except MailboxFull:
+                full.append(address)
+        return full
+
+    def _cast(self, address, message, urgent=False, sender=None,
+              trace_id=None, block=True):
         """For internal use.
 
         Send a message to an actor on this node.
@@ -643,7 +1710,7 @@ class Node(object):
         if _actor is None or _actor.dead:
             # Silently drop the message.
             return
-        _actor._cast(message)
+        _actor._cast(message, urgent, sender, trace_id, block)
 
     def _link(self, address, trap_exit=False):
         """Link the current Actor to the Actor at this address.
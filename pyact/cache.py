@@ -0,0 +1,87 @@
+# Copyright (c) 2012, Johan Rydberg
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""Result caches for memoized server methods."""
+
+from collections import OrderedDict
+import time
+
+
+class LRUCache(object):
+    """A cache of at most C{maxsize} entries that evicts the least
+    recently used entry first.
+
+    If C{ttl} is given, entries expire that many seconds after they
+    were put in the cache.  C{hits} and C{misses} count the outcome of
+    L{get}.
+    """
+
+    def __init__(self, maxsize=128, ttl=None, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        # Keys map to (expires, value) tuples, least recently used
+        # first.
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and not self._expired(entry)
+
+    def _expired(self, entry):
+        return entry[0] is not None and entry[0] <= self.clock()
+
+    def get(self, key, default=None):
+        """Return the value cached for C{key}, or C{default} if there
+        is none or it has expired.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None or self._expired(entry):
+            self.misses += 1
+            return default
+        self._entries[key] = entry
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        """Cache C{value} for C{key}."""
+        entries = self._entries
+        entries.pop(key, None)
+        if self.ttl is None:
+            expires = None
+        else:
+            expires = self.clock() + self.ttl
+        entries[key] = (expires, value)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def discard(self, key):
+        """Remove the entry for C{key}, if any."""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries."""
+        self._entries.clear()
@@ -0,0 +1,474 @@
+# Copyright (c) 2012, Johan Rydberg
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Wire codecs.
+
+A codec turns a message into a string of bytes and back.  Codecs are
+registered by name; a JSON codec is always available and a msgpack
+codec is available if the msgpack module is installed.
+
+Types other than the plain message types, such as addresses, are
+registered with each codec as extension types.  L{Record} messages
+are encoded as their tag followed by their field values, and objects
+with an C{_as_json_obj} method are encoded as what it returns.
+
+Binary data in a message is wrapped in a L{Binary}.  When a message is
+packed, binaries are taken out of the encoded message and carried
+alongside it as attachments: receivers in the same process get
+read-only memoryviews of the sender's bytes, and on the wire each
+attachment is a raw frame after the encoded message.
+"""
+
+import base64
+import struct
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from pyact import record
+from pyact.record import Record
+
+
+JSON, MSGPACK = 'json', 'msgpack'
+
+# The number of attachments and the length of the encoded message,
+# followed by the length of each attachment.
+_FRAME_HEADER = struct.Struct('!II')
+_FRAME_LENGTH = struct.Struct('!I')
+
+_codecs = {}
+
+
+def register(codec):
+    """Make C{codec} available under its name and return it."""
+    _codecs[codec.name] = codec
+    return codec
+
+
+def get(name):
+    """Return the codec registered as C{name}."""
+    try:
+        return _codecs[name]
+    except KeyError:
+        raise ValueError("unknown codec %r" % (name,))
+
+
+def available():
+    """Return the names of the registered codecs."""
+    return sorted(_codecs)
+
+
+class Binary(object):
+    """A string of bytes carried in a message.
+
+    JSON can only carry text, so binary data must be wrapped in a
+    Binary.  When encoded inline JSON carries it base64 encoded and
+    msgpack as raw bytes; when packed it becomes an attachment, and
+    the receiver gets a Binary whose value is a read-only memoryview.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        if isinstance(other, Binary):
+            other = other.value
+        return self.value == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.bytes())
+
+    def __repr__(self):
+        return 'Binary(%r)' % (self.bytes(),)
+
+    def __copy__(self):
+        return self.immutable()
+
+    def __deepcopy__(self, memo):
+        return self.immutable()
+
+    def immutable(self):
+        """Return a Binary of the same bytes that can not be changed:
+        this one if its value is immutable, or else one holding a
+        read-only copy of the value.
+        """
+        value = self.value
+        if type(value) is str or (type(value) is memoryview
+                                  and value.readonly):
+            return self
+        return Binary(self.buffer())
+
+    def bytes(self):
+        """Return the value as a string."""
+        if type(self.value) is str:
+            return self.value
+        return memoryview(self.value).tobytes()
+
+    def buffer(self):
+        """Return the value as a read-only memoryview.  The bytes are
+        only copied if the value is mutable.
+        """
+        value = self.value
+        if type(value) is memoryview:
+            if value.readonly:
+                return value
+            value = value.tobytes()
+        elif type(value) is not str:
+            value = str(value)
+        return memoryview(value)
+
+    def to_json(self):
+        return {'_pyact_binary': base64.b64encode(self.value)}
+
+    @classmethod
+    def from_json(cls, obj):
+        if obj.keys() == ['_pyact_binary']:
+            return cls(base64.b64decode(obj['_pyact_binary']))
+        return None
+
+
+class LazyMessage(object):
+    """An encoded message that is only decoded when it is used.
+
+    C{header} is the top level of the message as the codec would
+    decode it, with nested containers left empty, see L{Codec.header}.
+    It is enough to rule out most patterns without decoding.
+    """
+
+    __slots__ = ('codec', 'data', 'attachments', 'header')
+
+    def __init__(self, codec, data, attachments, header):
+        self.codec = codec
+        self.data = data
+        self.attachments = attachments
+        self.header = header
+
+    def decode(self):
+        """Return a newly decoded copy of the message."""
+        return self.codec.decode(self.data, self.attachments)
+
+
+def _placeholder(value, text):
+    value_type = type(value)
+    if value_type is dict:
+        return {}
+    elif value_type is list or value_type is tuple:
+        return []
+    elif value_type is str:
+        return text(value)
+    elif not isinstance(value, Record) and hasattr(value, '_as_json_obj'):
+        return _placeholder(value._as_json_obj(), text)
+    return value
+
+
+def _record(values):
+    return record.lookup(values[0]).from_values(values[1:])
+
+
+def _skeleton(message, text, string_keys):
+    """Return the top level of C{message} as a decoder would return
+    it, with nested containers replaced by empty ones.
+
+    Byte strings are passed through C{text}.  If C{string_keys} is
+    true and a dict has keys that are not strings, return None.
+    """
+    message_type = type(message)
+    if message_type is dict:
+        header = {}
+        for key, value in message.iteritems():
+            key_type = type(key)
+            if key_type is str:
+                key = text(key)
+            elif string_keys and key_type is not unicode:
+                return None
+            header[key] = _placeholder(value, text)
+        return header
+    elif message_type is list or message_type is tuple:
+        return [_placeholder(item, text) for item in message]
+    elif isinstance(message, Record):
+        return message_type.from_values([_placeholder(value, text)
+                                         for value in message.values()])
+    elif hasattr(message, '_as_json_obj'):
+        # Such objects are encoded as what the method returns, and
+        # that is what the message is matched as.
+        return _skeleton(message._as_json_obj(), text, string_keys)
+    return _placeholder(message, text)
+
+
+class Codec(object):
+    """Base class for codecs."""
+
+    name = None
+
+    def encode(self, message, attachments=None):
+        """Return C{message} encoded as a string.
+
+        If C{attachments} is a list, L{Binary} values are appended to
+        it as memoryviews and only referred to by the encoded message.
+        """
+        raise NotImplementedError("Implement in subclass.")
+
+    def decode(self, data, attachments=None):
+        """Return the message encoded in C{data}, taking references
+        to attachments from C{attachments}.
+        """
+        raise NotImplementedError("Implement in subclass.")
+
+    def _attach(self, obj, attachments):
+        """Default hook for encoding with attachments."""
+        if type(obj) is Binary:
+            attachments.append(obj.buffer())
+            return self._reference(len(attachments) - 1)
+        return self._default(obj, attachments)
+
+    def pack(self, message):
+        """Encode C{message} with its attachments kept apart.  Return
+        a value for L{unpack}.
+        """
+        attachments = []
+        return self.encode(message, attachments), attachments
+
+    def unpack(self, packed):
+        """Return a newly decoded copy of a message returned by
+        L{pack}.  Attachments are shared, not copied.
+        """
+        data, attachments = packed
+        return self.decode(data, attachments)
+
+    def encode_frames(self, message):
+        """Return C{message} encoded for the wire, as a list of strings
+        and buffers to be written in order.
+
+        The encoded message is followed by a raw frame for each
+        attachment.  Each frame is preceded by its length.
+        """
+        data, attachments = self.pack(message)
+        frames = [_FRAME_HEADER.pack(len(attachments), len(data)), data]
+        for attachment in attachments:
+            frames.append(_FRAME_LENGTH.pack(len(attachment)))
+            frames.append(attachment)
+        return frames
+
+    def decode_frames(self, data):
+        """Decode a message from the frames written by
+        L{encode_frames}.  Attachments are memoryviews into C{data}.
+        """
+        view = memoryview(data)
+        count, length = _FRAME_HEADER.unpack_from(data, 0)
+        offset = _FRAME_HEADER.size
+        encoded = view[offset:offset + length].tobytes()
+        offset += length
+        attachments = []
+        for i in xrange(count):
+            length, = _FRAME_LENGTH.unpack_from(data, offset)
+            offset += _FRAME_LENGTH.size
+            attachments.append(view[offset:offset + length])
+            offset += length
+        return self.decode(encoded, attachments)
+
+    def header(self, message):
+        """Return the header of C{message} for a L{LazyMessage}, or
+        None if the codec can not tell how the message decodes.
+
+        A message only matches a pattern if its header matches the
+        pattern with its nested containers replaced by their types.
+        """
+        return None
+
+    def lazy(self, message):
+        """Encode C{message} and return it as a L{LazyMessage}.
+
+        If the codec can not make a header for the message, it is
+        decoded right away instead.
+        """
+        data, attachments = self.pack(message)
+        header = self.header(message)
+        if header is None:
+            return self.decode(data, attachments)
+        return LazyMessage(self, data, attachments, header)
+
+
+class JSONCodec(Codec):
+    """Codec that encodes messages as JSON.
+
+    An extension type is encoded as an object with a single member
+    whose name identifies the type, so the decoder only has to look
+    at objects of one member.  Records are encoded as
+    C{{"_pyact_record": [tag, value, ...]}}.
+    """
+
+    name = JSON
+
+    def __init__(self):
+        self._types = {}
+        self._keys = {}
+        self.register_type(Binary, '_pyact_binary',
+                           lambda binary: base64.b64encode(binary.value),
+                           lambda value: Binary(base64.b64decode(value)))
+        self._keys['_pyact_record'] = _record
+
+    def register_type(self, cls, key, to_json, from_json):
+        """Encode instances of C{cls} as C{{key: to_json(obj)}}, and
+        decode such objects with C{from_json(value)}.
+        """
+        self._types[cls] = (key, to_json)
+        self._keys[key] = from_json
+
+    def _default(self, obj, attachments=None):
+        # The values of a record are encoded by the same hook, so
+        # there is no need to pass on the attachments.
+        entry = self._types.get(type(obj))
+        if entry is not None:
+            key, to_json = entry
+            return {key: to_json(obj)}
+        elif isinstance(obj, Record):
+            return {'_pyact_record': [obj.tag] + obj.values()}
+        elif hasattr(obj, '_as_json_obj'):
+            return obj._as_json_obj()
+        raise TypeError("%r is not JSON serializable" % (obj,))
+
+    def _reference(self, index):
+        return {'_pyact_attachment': index}
+
+    def _object_hook(self, obj, attachments=None):
+        if len(obj) == 1:
+            for key, value in obj.iteritems():
+                if key == '_pyact_attachment' and attachments is not None:
+                    return Binary(attachments[value])
+                from_json = self._keys.get(key)
+                if from_json is not None:
+                    return from_json(value)
+        return obj
+
+    def encode(self, message, attachments=None):
+        if attachments is None:
+            default = self._default
+        else:
+            default = lambda obj: self._attach(obj, attachments)
+        return json.dumps(message, default=default, separators=(',', ':'))
+
+    def decode(self, data, attachments=None):
+        if attachments is None:
+            object_hook = self._object_hook
+        else:
+            object_hook = lambda obj: self._object_hook(obj, attachments)
+        return json.loads(data, object_hook=object_hook)
+
+    def header(self, message):
+        # Sequences decode as lists, strings as unicode and object
+        # member names are always strings.
+        return _skeleton(message, _utf8, True)
+
+
+class MsgpackCodec(Codec):
+    """Codec that encodes messages with msgpack.
+
+    Extension types are encoded as msgpack extension types; codes 2,
+    3 and 4 are taken by L{Binary}, attachments and records.  Byte
+    strings and unicode strings keep their types.
+    """
+
+    name = MSGPACK
+
+    def __init__(self):
+        self._types = {}
+        self._codes = {}
+        self.register_type(Binary, 2, Binary.bytes, Binary)
+
+    def register_type(self, cls, code, to_data, from_data):
+        """Encode instances of C{cls} as the extension type C{code}
+        holding the msgpack encoding of C{to_data(obj)}, and decode it
+        with C{from_data(value)}.
+        """
+        self._types[cls] = (code, to_data)
+        self._codes[code] = from_data
+
+    def _default(self, obj, attachments=None):
+        entry = self._types.get(type(obj))
+        if entry is not None:
+            code, to_data = entry
+            return msgpack.ExtType(code, msgpack.packb(to_data(obj),
+                                                       use_bin_type=True))
+        elif isinstance(obj, Record):
+            # Unlike registered types, field values may be anything,
+            # so they are packed with the same hooks as the message.
+            return msgpack.ExtType(4, self.encode([obj.tag] + obj.values(),
+                                                  attachments))
+        elif hasattr(obj, '_as_json_obj'):
+            return obj._as_json_obj()
+        raise TypeError("%r is not msgpack serializable" % (obj,))
+
+    def _reference(self, index):
+        return msgpack.ExtType(3, msgpack.packb(index))
+
+    def _ext_hook(self, code, data, attachments=None):
+        if code == 3 and attachments is not None:
+            return Binary(attachments[msgpack.unpackb(data)])
+        elif code == 4:
+            return _record(self.decode(data, attachments))
+        from_data = self._codes.get(code)
+        if from_data is None:
+            return msgpack.ExtType(code, data)
+        return from_data(msgpack.unpackb(data, raw=False))
+
+    def encode(self, message, attachments=None):
+        if attachments is None:
+            default = self._default
+        else:
+            default = lambda obj: self._attach(obj, attachments)
+        return msgpack.packb(message, default=default, use_bin_type=True)
+
+    def decode(self, data, attachments=None):
+        if attachments is None:
+            ext_hook = self._ext_hook
+        else:
+            ext_hook = lambda code, data: self._ext_hook(code, data,
+                                                         attachments)
+        return msgpack.unpackb(data, ext_hook=ext_hook, raw=False)
+
+    def header(self, message):
+        return _skeleton(message, _identity, False)
+
+
+def _utf8(value):
+    return value.decode('utf-8')
+
+
+def _identity(value):
+    return value
+
+
+register(JSONCodec())
+if msgpack is not None:
+    register(MsgpackCodec())
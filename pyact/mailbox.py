@@ -0,0 +1,356 @@
+# Copyright (c) 2012, Johan Rydberg
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Actor mailboxes with selective receive."""
+
+from collections import deque
+import heapq
+import time
+
+from pyact import shape
+from pyact.codec import LazyMessage
+from pyact.record import Record
+
+
+# Dict keys whose literal values are indexed.  Tuples are indexed on
+# their leading element, using 0 as the key name.
+INDEXED_KEYS = ('response', 'call')
+
+_REMOVED = object()
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # Python 2 has no monotonic clock in the standard library.
+    monotonic = time.time
+
+
+class Envelope(object):
+    """Delivery details kept next to a message in a mailbox.
+
+    C{sender} is the address of the sending actor, or None if the
+    message was not sent by an actor.  C{enqueued} is the L{monotonic}
+    time the message was put in the mailbox, and C{trace_id} is the
+    correlation id the sender gave, if any.
+    """
+
+    __slots__ = ('sender', 'enqueued', 'trace_id')
+
+    def __init__(self, sender, enqueued, trace_id=None):
+        self.sender = sender
+        self.enqueued = enqueued
+        self.trace_id = trace_id
+
+    def queue_delay(self):
+        """Return the number of seconds since the message was put in
+        the mailbox.
+        """
+        return monotonic() - self.enqueued
+
+    def __repr__(self):
+        return 'Envelope(%r, %r, %r)' % (self.sender, self.enqueued,
+                                         self.trace_id)
+
+
+def _message_keys(message):
+    """Return the index keys for a message."""
+    if type(message) is LazyMessage:
+        message = message.header
+    if isinstance(message, dict):
+        keys = ()
+        for name in INDEXED_KEYS:
+            if name in message:
+                value = message[name]
+                try:
+                    hash(value)
+                except TypeError:
+                    continue
+                keys += ((name, value),)
+        return keys
+    elif isinstance(message, tuple) and message:
+        try:
+            hash(message[0])
+        except TypeError:
+            return ()
+        return ((0, message[0]),)
+    return ()
+
+
+def _pattern_key(pattern):
+    """Return the index key a pattern pins to a literal, or None if
+    the pattern may match messages without that key.
+    """
+    if type(pattern) is dict:
+        for name in INDEXED_KEYS:
+            if name in pattern and shape.is_literal(pattern[name]):
+                return (name, pattern[name])
+    elif type(pattern) is tuple and pattern:
+        if shape.is_literal(pattern[0]):
+            return (0, pattern[0])
+    return None
+
+
+def _shallow_value(value):
+    value_type = type(value)
+    if value_type in (dict, list, tuple, set):
+        return value_type
+    elif isinstance(value, Record):
+        return value_type
+    return value
+
+
+_shallow = {}
+
+
+def _shallow_pattern(pattern):
+    """Return a version of C{pattern} for matching the header of a
+    L{LazyMessage}: nested container patterns are replaced by their
+    types, which match the empty containers of the header.
+    """
+    entry = _shallow.get(id(pattern))
+    if entry is not None and entry[0] is pattern:
+        return entry[1]
+    pattern_type = type(pattern)
+    if pattern_type is dict:
+        result = dict((name, _shallow_value(value))
+                      for name, value in pattern.iteritems())
+    elif pattern_type in (list, tuple, set):
+        result = pattern_type(_shallow_value(item) for item in pattern)
+    elif isinstance(pattern, Record):
+        result = pattern_type.from_values([_shallow_value(value)
+                                           for value in pattern.values()])
+    else:
+        result = pattern
+    if len(_shallow) >= shape.MAX_COMPILED:
+        _shallow.clear()
+    _shallow[id(pattern)] = (pattern, result)
+    return result
+
+
+def _header_select(patterns):
+    """Return a function that tells whether a L{LazyMessage} might
+    match any of the patterns, judging by its header.
+    """
+    select = shape.compile_many(tuple(_shallow_pattern(pattern)
+                                      for pattern in patterns))
+    return lambda message: select(message.header) >= 0
+
+
+def _unique(seqs):
+    """Yield the numbers of the sorted iterable C{seqs} once each."""
+    last = None
+    for seq in seqs:
+        if seq != last:
+            yield seq
+            last = seq
+
+
+class Mailbox(object):
+    """A queue of messages supporting selective receive.
+
+    Messages are kept in arrival order.  Besides that the mailbox
+    keeps secondary indexes on the literal values of C{INDEXED_KEYS}
+    in dict messages and on the leading element of tuple messages, so
+    a receive where every pattern pins one of those to a literal only
+    looks at the messages carrying it.
+
+    A L{LazyMessage} stays encoded in the mailbox; it is decoded when
+    it is taken out, or when its header matches a pattern.
+
+    A message may be appended with an L{Envelope}.  Methods that take
+    messages out return the envelope along with each message if
+    C{with_envelope} is true; it is None for messages without one.
+    """
+
+    def __init__(self):
+        self._seq = 0
+        # The largest number of messages held at any time.
+        self.high_water = 0
+        self._messages = {}
+        self._envelopes = {}
+        # Sequence numbers in arrival order.  Messages removed from
+        # the middle of the mailbox leave their sequence number
+        # behind until the next compaction.
+        self._order = deque()
+        self._index = {}
+
+    def __len__(self):
+        return len(self._messages)
+
+    last = property(lambda self: self._seq,
+                    doc="Sequence number of the most recent message.")
+
+    def append(self, message, envelope=None):
+        """Put a message at the end of the mailbox."""
+        self._seq += 1
+        seq = self._seq
+        self._messages[seq] = message
+        if envelope is not None:
+            self._envelopes[seq] = envelope
+        self._order.append(seq)
+        if len(self._messages) > self.high_water:
+            self.high_water = len(self._messages)
+        for key in _message_keys(message):
+            seqs = self._index.get(key)
+            if seqs is None:
+                seqs = self._index[key] = deque()
+            seqs.append(seq)
+
+    def popleft(self, with_envelope=False):
+        """Remove and return the oldest message, or a (message,
+        envelope) tuple if C{with_envelope} is true.
+
+        Raise C{IndexError} if the mailbox is empty.
+        """
+        order, messages = self._order, self._messages
+        while order:
+            seq = order.popleft()
+            message = messages.pop(seq, _REMOVED)
+            if message is not _REMOVED:
+                self._unindex(seq, message)
+                envelope = self._envelopes.pop(seq, None)
+                if type(message) is LazyMessage:
+                    message = message.decode()
+                if with_envelope:
+                    return message, envelope
+                return message
+        raise IndexError("pop from an empty mailbox")
+
+    def _remove(self, seq):
+        """Remove a message, and return its envelope."""
+        message = self._messages.pop(seq)
+        envelope = self._envelopes.pop(seq, None)
+        self._unindex(seq, message)
+        if len(self._order) > 2 * len(self._messages) + 64:
+            messages = self._messages
+            self._order = deque(seq for seq in self._order
+                                if seq in messages)
+        return envelope
+
+    def _unindex(self, seq, message):
+        for key in _message_keys(message):
+            seqs = self._index[key]
+            if seqs[0] == seq:
+                seqs.popleft()
+            elif seqs[-1] == seq:
+                seqs.pop()
+            else:
+                seqs.remove(seq)
+            if not seqs:
+                del self._index[key]
+
+    def _candidates(self, patterns, after):
+        """Return the sequence numbers after C{after} that may match
+        any of the given patterns, in arrival order.
+        """
+        if after:
+            # Everything up to after has already been tested, so only
+            # look at what arrived since.
+            return xrange(after + 1, self._seq + 1)
+        keys = set()
+        for pattern in patterns:
+            key = _pattern_key(pattern)
+            if key is None:
+                return self._order
+            keys.add(key)
+        index = self._index
+        if len(keys) == 1:
+            return index.get(keys.pop(), ())
+        # A message with several indexed keys is in several indexes.
+        return _unique(heapq.merge(*[index[key] for key in keys
+                                     if key in index]))
+
+    def select(self, patterns, after=0, with_envelope=False):
+        """Remove and return the first message matching any of the
+        patterns, as a (pattern, message) tuple, or a (pattern,
+        message, envelope) tuple if C{with_envelope} is true.  If no
+        message matches, the members of the tuple are None.
+
+        If C{after} is given, only messages with a sequence number
+        greater than it are considered.  A receive that found nothing
+        passes the previous value of C{last} here when it wakes up, so
+        messages that already failed to match are not tested again.
+        """
+        messages = self._messages
+        if not messages:
+            if with_envelope:
+                return None, None, None
+            return None, None
+        select = shape.compile_many(patterns)
+        might_match = None
+        for seq in self._candidates(patterns, after):
+            message = messages.get(seq, _REMOVED)
+            if message is _REMOVED:
+                continue
+            if type(message) is LazyMessage:
+                if might_match is None:
+                    might_match = _header_select(patterns)
+                if not might_match(message):
+                    continue
+                message = message.decode()
+            index = select(message)
+            if index >= 0:
+                envelope = self._remove(seq)
+                if with_envelope:
+                    return patterns[index], message, envelope
+                return patterns[index], message
+        if with_envelope:
+            return None, None, None
+        return None, None
+
+    def select_many(self, patterns, after=0, limit=None,
+                    with_envelope=False):
+        """Remove and return the messages matching any of the
+        patterns, as a list of (pattern, message) tuples in arrival
+        order, or (pattern, message, envelope) tuples if
+        C{with_envelope} is true.  At most C{limit} messages are
+        returned, if given.
+
+        C{after} has the same meaning as for L{select}.
+        """
+        messages = self._messages
+        if not messages or limit == 0:
+            return []
+        select = shape.compile_many(patterns)
+        might_match = None
+        found = []
+        for seq in self._candidates(patterns, after):
+            message = messages.get(seq, _REMOVED)
+            if message is _REMOVED:
+                continue
+            if type(message) is LazyMessage:
+                if might_match is None:
+                    might_match = _header_select(patterns)
+                if not might_match(message):
+                    continue
+                message = message.decode()
+            index = select(message)
+            if index >= 0:
+                found.append((seq, patterns[index], message))
+                if len(found) == limit:
+                    break
+        if with_envelope:
+            return [(pattern, message, self._remove(seq))
+                    for seq, pattern, message in found]
+        for seq, pattern, message in found:
+            self._remove(seq)
+        return [(pattern, message) for seq, pattern, message in found]
@@ -0,0 +1,197 @@
+# Copyright (c) 2012, Johan Rydberg
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Record message types.
+
+A record is a message type declared as a class with a fixed list of
+fields::
+
+    class Move(Record):
+        fields = ('piece', ('to', (int, int)))
+
+Records are stored in C{__slots__}, so they take less memory than a
+dict with the same members.  The class itself is a pattern that
+matches its records with a single type check, and a record whose
+fields hold shapes is a pattern that also matches on the fields; see
+L{Record.pattern}.  Codecs encode records as their tag followed by the
+field values in order.  L{Record.frozen} makes an immutable copy
+of a record.
+"""
+
+
+# Record classes by tag, for decoding.
+_records = {}
+
+
+def lookup(tag):
+    """Return the record class registered under C{tag}."""
+    try:
+        return _records[tag]
+    except KeyError:
+        raise ValueError("unknown record type %r" % (tag,))
+
+
+# Immutable variants of record classes, by record class.
+_frozen_types = {}
+
+
+def _rebuild(cls, values, frozen=False):
+    record = cls.from_values(values)
+    if frozen:
+        return record.frozen()
+    return record
+
+
+def _refuse(self, *args):
+    raise TypeError("%s record is frozen" % (type(self).__name__,))
+
+
+class RecordType(type):
+    """Metaclass of records.
+
+    Turns the C{fields} of a record class into slots, and registers
+    the class under its C{tag}, which defaults to the qualified name
+    of the class.  The immutable variants made by L{Record.frozen}
+    share the tag of their record class and are not registered.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        spec = []
+        for field in namespace.get('fields', ()):
+            if isinstance(field, basestring):
+                field = (field, object)
+            spec.append(tuple(field))
+        namespace['__slots__'] = tuple(field for field, shape in spec)
+        cls = type.__new__(mcs, name, bases, namespace)
+        parent = getattr(super(cls, cls), '_spec', ())
+        cls._spec = tuple(parent) + tuple(spec)
+        cls._names = tuple(field for field, shape in cls._spec)
+        if 'tag' not in namespace:
+            cls.tag = '%s.%s' % (cls.__module__, name)
+        if cls._names and not cls._frozen:
+            _records[cls.tag] = cls
+        return cls
+
+
+class Record(object):
+    """Base class of record message types.
+
+    C{fields} lists the fields, either as names or as (name, shape)
+    pairs; the shapes are used by L{pattern}.  A subclass of a record
+    type adds its fields to those of its parent.
+    """
+
+    __metaclass__ = RecordType
+
+    fields = ()
+
+    _frozen = False
+
+    def __init__(self, *args, **kw):
+        names = self._names
+        if len(args) > len(names):
+            raise TypeError("%s takes %d fields, %d given" % (
+                    type(self).__name__, len(names), len(args)))
+        for name, value in zip(names, args):
+            setattr(self, name, value)
+        for name in names[len(args):]:
+            try:
+                setattr(self, name, kw.pop(name))
+            except KeyError:
+                raise TypeError("%s is missing field %r" % (
+                        type(self).__name__, name))
+        if kw:
+            raise TypeError("%s has no fields %s" % (
+                    type(self).__name__, ', '.join(sorted(kw))))
+
+    @classmethod
+    def pattern(cls, **kw):
+        """Return a record that matches records of this type whose
+        fields are shaped like the field shapes of the type, or like
+        the shapes given as keyword arguments.
+        """
+        for name, shape in cls._spec:
+            kw.setdefault(name, shape)
+        return cls(**kw)
+
+    @classmethod
+    def from_values(cls, values):
+        """Return a record with the given field values, in order."""
+        record = cls.__new__(cls)
+        for name, value in zip(cls._names, values):
+            object.__setattr__(record, name, value)
+        return record
+
+    def frozen(self, convert=None):
+        """Return a copy of this record whose fields can not be
+        assigned, with the field values passed through C{convert} if
+        given.  The copy is an instance of a subclass of the record
+        type, so it matches the same patterns and equals this record.
+        """
+        cls = type(self)
+        if cls._frozen:
+            if convert is None:
+                return self
+            cls = cls.__bases__[0]
+        frozen_type = _frozen_types.get(cls)
+        if frozen_type is None:
+            frozen_type = _frozen_types[cls] = RecordType(
+                cls.__name__, (cls,), {
+                    '__module__': cls.__module__, 'tag': cls.tag,
+                    '_frozen': True, '__setattr__': _refuse,
+                    '__delattr__': _refuse})
+        values = self.values()
+        if convert is not None:
+            values = [convert(value) for value in values]
+        return frozen_type.from_values(values)
+
+    def _record_type(self):
+        cls = type(self)
+        if cls._frozen:
+            return cls.__bases__[0]
+        return cls
+
+    def values(self):
+        """Return the field values, in order."""
+        return [getattr(self, name) for name in self._names]
+
+    def _as_json_obj(self):
+        return dict(zip(self._names, self.values()))
+
+    def __eq__(self, other):
+        return (isinstance(other, Record)
+                and self._record_type() is other._record_type()
+                and self.values() == other.values())
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (_rebuild, (self._record_type(), self.values(),
+                           self._frozen))
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+                '%s=%r' % (name, value)
+                for name, value in zip(self._names, self.values())))
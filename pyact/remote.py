@@ -35,7 +35,8 @@ class RemoteNode(object):
         self.id = id
         self.cookie = cookie
 
-    def _cast(self, address, message):
+    def _cast(self, address, message, urgent=False, sender=None,
+              trace_id=None, block=True):
         """For internal use.
 
         Send a message to an actor on this node.
@@ -44,7 +45,23 @@ class RemoteNode(object):
         if _actor is None or _actor.dead:
             # Silently drop the message.
             return
-        _actor._cast(message)
+        _actor._cast(message, urgent, sender, trace_id, block)
+
+    def _multicast(self, addresses, packed, unpack, urgent=False,
+                   sender=None, trace_id=None):
+        """For internal use.
+
+        Send a packed message to actors on this node, and return the
+        addresses of those whose mailbox was full.
+        """
+        full = []
+        for address in addresses:
+            try:
+                self._cast(address, unpack(packed), urgent, sender,
+                           trace_id)
+            except actor.MailboxFull:
+                full.append(address)
+        return full
 
 from gevent import socket, queue
 import gevent
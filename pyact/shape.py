@@ -22,6 +22,8 @@ THE SOFTWARE.
 
 import sys
 
+from pyact.record import Record
+
 PY_MAJOR_VERSION = sys.version_info[0]
 
 
@@ -75,6 +77,13 @@ def is_shaped_exc(thing, shape):
 
     if shape_type is object:
         return
+    elif isinstance(shape, Record):
+        if not isinstance(thing, shape_type):
+            raise TypeMismatch("type %s is not a %s" % (
+                    type(thing), shape_type.__name__))
+        for name, subtype in zip(shape._names, shape.values()):
+            is_shaped_exc(getattr(thing, name), subtype)
+        return
     elif shape_type in CONTAINER_TYPES:
         if shape_type is dict:
             if not isinstance(thing, dict):
@@ -122,6 +131,303 @@ def is_shaped_exc(thing, shape):
                 thing, shape_type, type(thing)))
 
 
+def _match_object(thing):
+    return True
+
+
+def _compile_type(shape):
+    # Mirrors the tail of is_shaped_exc: a thing whose type is the
+    # shape's own metatype (i.e. a class) only matches by equality,
+    # anything else is checked with isinstance.
+    metatype = type(shape)
+    if PY_MAJOR_VERSION == 2 and (shape is str or shape is unicode):
+        # str things are matched as unicode, see is_shaped_exc.
+        shape = unicode
+        def matcher(thing):
+            if type(thing) is metatype:
+                return thing == shape
+            return isinstance(thing, unicode) or type(thing) is str
+        return matcher
+    def matcher(thing):
+        if type(thing) is metatype:
+            return thing == shape
+        return isinstance(thing, shape)
+    return matcher
+
+
+def _compile_literal(shape):
+    if PY_MAJOR_VERSION == 2 and type(shape) in (str, unicode):
+        shape = unicode(shape)
+        string_types = (str, unicode)
+        def matcher(thing):
+            return type(thing) in string_types and thing == shape
+        return matcher
+    shape_type = type(shape)
+    def matcher(thing):
+        return type(thing) is shape_type and thing == shape
+    return matcher
+
+
+def _compile_dict(shape):
+    items = [(name, _compile(subshape)) for name, subshape in shape.items()]
+    def matcher(thing):
+        if not isinstance(thing, dict):
+            return False
+        for name, submatcher in items:
+            if name not in thing or not submatcher(thing[name]):
+                return False
+        return True
+    return matcher
+
+
+def _compile_sequence(shape):
+    for subshape in shape:
+        break
+    else:
+        # An empty list or set shape only matches empty containers.
+        return lambda thing: isinstance(thing, (list, set)) and not thing
+    submatcher = _compile(subshape)
+    def matcher(thing):
+        if not isinstance(thing, (list, set)):
+            return False
+        for subitem in thing:
+            if not submatcher(subitem):
+                return False
+        return True
+    return matcher
+
+
+def _compile_tuple(shape):
+    submatchers = tuple(_compile(subshape) for subshape in shape)
+    size = len(submatchers)
+    def matcher(thing):
+        if not isinstance(thing, tuple) or len(thing) != size:
+            return False
+        for submatcher, subitem in zip(submatchers, thing):
+            if not submatcher(subitem):
+                return False
+        return True
+    return matcher
+
+
+def _compile_record(shape):
+    record_type = type(shape)
+    submatchers = [(name, _compile(subshape)) for name, subshape
+                   in zip(shape._names, shape.values())
+                   if type(subshape) is not object and subshape is not object]
+    def matcher(thing):
+        if not isinstance(thing, record_type):
+            return False
+        for name, submatcher in submatchers:
+            if not submatcher(getattr(thing, name)):
+                return False
+        return True
+    return matcher
+
+
+def _compile(shape):
+    shape_type = type(shape)
+    if shape_type is object:
+        return _match_object
+    elif isinstance(shape, Record):
+        return _compile_record(shape)
+    elif shape_type is dict:
+        return _compile_dict(shape)
+    elif shape_type is list or shape_type is set:
+        return _compile_sequence(shape)
+    elif shape_type is tuple:
+        return _compile_tuple(shape)
+    elif isinstance(shape, type):
+        return _compile_type(shape)
+    return _compile_literal(shape)
+
+
+# Compiled matchers keyed by id() of the pattern.  The pattern itself
+# is kept in the entry so that its id cannot be reused while cached.
+_compiled = {}
+
+MAX_COMPILED = 4096
+
+
+def compile(shape):
+    """Return a function that takes a thing and returns True if it
+    is shaped like C{shape}, False otherwise.
+
+    This is equivalent to C{is_shaped(thing, shape)}, but the shape is
+    only walked once; the returned matcher is specialized for it and
+    never raises for a mismatch.  Matchers are cached by the identity
+    of C{shape}, so patterns should not be mutated once used.
+    """
+    entry = _compiled.get(id(shape))
+    if entry is not None and entry[0] is shape:
+        return entry[1]
+    matcher = _compile(shape)
+    if len(_compiled) >= MAX_COMPILED:
+        _compiled.clear()
+    _compiled[id(shape)] = (shape, matcher)
+    return matcher
+
+
+# Marks tuple shapes without a literal leading tag.
+_ANY = object()
+
+
+def is_literal(shape):
+    """Return True if shape only matches things equal to itself, and
+    can therefore be used to index patterns.
+    """
+    if type(shape) in (dict, list, set, tuple, object):
+        return False
+    if isinstance(shape, type):
+        return False
+    try:
+        hash(shape)
+    except TypeError:
+        return False
+    return True
+
+
+def _dict_discriminator(shapes):
+    """Return the key which has a literal value in most of the given
+    dict shapes, or None if no shape has a literal value.
+    """
+    counts = {}
+    for shape in shapes:
+        for name, subshape in shape.items():
+            if is_literal(subshape):
+                counts[name] = counts.get(name, 0) + 1
+    if not counts:
+        return None
+    return max(counts, key=counts.get)
+
+
+def _candidates(matchers, *groups):
+    indexes = set()
+    for group in groups:
+        indexes.update(group)
+    return tuple((index, matchers[index]) for index in sorted(indexes))
+
+
+def _compile_many(shapes):
+    matchers = [compile(shape) for shape in shapes]
+    generic, dicts, sequences, tuples = [], [], [], {}
+    records = []
+    for index, shape in enumerate(shapes):
+        shape_type = type(shape)
+        if isinstance(shape, Record):
+            records.append((index, shape_type))
+        elif isinstance(shape, type) and issubclass(shape, Record):
+            records.append((index, shape))
+        elif shape_type is dict:
+            dicts.append(index)
+        elif shape_type is list or shape_type is set:
+            sequences.append(index)
+        elif shape_type is tuple:
+            if shape and is_literal(shape[0]):
+                tag = shape[0]
+            else:
+                tag = _ANY
+            tags = tuples.setdefault(len(shape), {})
+            tags.setdefault(tag, []).append(index)
+        else:
+            # Types and literals at the top level; these may match
+            # anything so they are candidates for every message.
+            generic.append(index)
+
+    any_thing = _candidates(matchers, generic)
+    any_sequence = _candidates(matchers, sequences, generic)
+
+    key = _dict_discriminator([shapes[index] for index in dicts])
+    by_value, rest = {}, []
+    for index in dicts:
+        subshape = shapes[index].get(key, _ANY)
+        if key is not None and is_literal(subshape):
+            by_value.setdefault(subshape, []).append(index)
+        else:
+            rest.append(index)
+    any_dict = _candidates(matchers, rest, generic)
+    for value, indexes in by_value.items():
+        by_value[value] = _candidates(matchers, indexes, rest, generic)
+
+    by_size = {}
+    for size, tags in tuples.items():
+        wildcards = tags.pop(_ANY, [])
+        by_tag = {}
+        for tag, indexes in tags.items():
+            by_tag[tag] = _candidates(matchers, indexes, wildcards, generic)
+        by_size[size] = (by_tag, _candidates(matchers, wildcards, generic))
+
+    # Candidates for records, by record type; filled in on demand
+    # since a pattern for a record type also matches its subtypes.
+    by_record = {}
+
+    def select(thing):
+        if isinstance(thing, Record):
+            record_type = type(thing)
+            candidates = by_record.get(record_type)
+            if candidates is None:
+                candidates = by_record[record_type] = _candidates(
+                    matchers, generic, [index for index, cls in records
+                                        if issubclass(record_type, cls)])
+        elif isinstance(thing, dict):
+            candidates = any_dict
+            if by_value and key in thing:
+                try:
+                    candidates = by_value.get(thing[key], any_dict)
+                except TypeError:
+                    pass
+        elif isinstance(thing, tuple):
+            entry = by_size.get(len(thing))
+            if entry is None:
+                candidates = any_thing
+            else:
+                by_tag, candidates = entry
+                if by_tag:
+                    try:
+                        candidates = by_tag.get(thing[0], candidates)
+                    except TypeError:
+                        pass
+        elif isinstance(thing, (list, set)):
+            candidates = any_sequence
+        else:
+            candidates = any_thing
+        for index, matcher in candidates:
+            if matcher(thing):
+                return index
+        return -1
+    return select
+
+
+_compiled_many = {}
+
+
+def compile_many(shapes):
+    """Return a function that takes a thing and returns the index of
+    the first shape in C{shapes} the thing is shaped like, or -1 if
+    there is no such shape.
+
+    The shapes are arranged in a discrimination tree that switches on
+    the container type, record type, tuple length, leading tuple tag
+    and literal dict values, so only shapes that could possibly match
+    are tried.
+    Like C{compile}, results are cached by the identity of the shapes.
+    """
+    ids = tuple(map(id, shapes))
+    entry = _compiled_many.get(ids)
+    if entry is not None:
+        cached, select = entry
+        for shape, other in zip(shapes, cached):
+            if shape is not other:
+                break
+        else:
+            return select
+    select = _compile_many(shapes)
+    if len(_compiled_many) >= MAX_COMPILED:
+        _compiled_many.clear()
+    _compiled_many[ids] = (tuple(shapes), select)
+    return select
+
+
 class MalformedShape(Exception):
     pass
 
@@ -158,6 +464,8 @@ def calculate_shape(what):
         return [calculate_shape(what[0])]
     elif what_type is tuple:
         return tuple(map(calculate_shape, what))
+    elif isinstance(what, Record):
+        return what_type.from_values(map(calculate_shape, what.values()))
     else:
         return type(what)
 
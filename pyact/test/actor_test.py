@@ -19,10 +19,17 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import itertools
+import numbers
+import pickle
+import sys
+import time
 import unittest
 import gevent
+from gevent.hub import GreenletExit
 #import gevent
 from pyact import actor
+from pyact import codec
 from pyact import exc
 import base64
 
@@ -429,8 +436,10 @@ class TestActor(unittest.TestCase):
 
         cancel = gevent.Timeout(1)
         cancel.start()
-        result1, result2 = actor.spawn(WaitAll).wait()
-        cancel.cancel()
+        try:
+            result1, result2 = actor.spawn(WaitAll).wait()
+        finally:
+            cancel.cancel()
 
         result1 = [x.get('exit') for x in result1]
         result2 = [x.get('exit') for x in result2]
@@ -441,12 +450,12 @@ class TestActor(unittest.TestCase):
     def test_build_call_pattern(self):
         
         assert actor.build_call_pattern('meth1') == {'address': actor.Address,
-                                                     'call': str,
+                                                     'call': numbers.Integral,
                                                      'message': object,
                                                      'method': 'meth1'}
         
         assert actor.build_call_pattern('meth2',int) == {'address': actor.Address,
-                                                         'call': str,
+                                                         'call': numbers.Integral,
                                                          'message': int,
                                                          'method': 'meth2'}
 
@@ -454,6 +463,933 @@ class TestActor(unittest.TestCase):
                                                          
 
 
+def make_node(**kw):
+    return actor.Node(actor.Mesh(), 'cookie@localhost.local:3232', **kw)
+
+
+def drain(receive):
+    """Let the sender fill the mailbox, then drain it."""
+    gevent.sleep(0.01)
+    result = []
+    while True:
+        pat, msg = receive(timeout=0)
+        if pat is None:
+            return result
+        result.append(msg)
+
+
+class TestAddress(unittest.TestCase):
+
+    def test_interned(self):
+        address = actor.Address('a@localhost.local:3232', 7)
+        self.assertTrue(actor.Address('a@localhost.local:3232', 7)
+                        is address)
+        decoded = codec.get(codec.JSON).unpack(
+            codec.get(codec.JSON).pack([address]))[0]
+        self.assertTrue(decoded is address)
+        self.assertFalse(hasattr(address, '__dict__'))
+
+    def test_equality(self):
+        address = actor.Address('a@localhost.local:3232', 7)
+        copied = pickle.loads(pickle.dumps(address))
+        self.assertEquals(copied, address)
+        self.assertEquals(len(set([address, copied])), 1)
+        self.assertNotEquals(address, actor.Address('b@localhost.local:3232',
+                                                    7))
+        self.assertNotEquals(address, actor.Address('a@localhost.local:3232',
+                                                    8))
+
+    def test_ids(self):
+        node = make_node()
+        first, second = node.spawn(lambda receive: None), node.spawn(
+            lambda receive: None)
+        self.assertTrue(isinstance(first.actor_id, int))
+        self.assertEquals(second.actor_id, first.actor_id + 1)
+
+
+class TestBoundedMailbox(unittest.TestCase):
+
+    def fill(self, overflow, count):
+        node = make_node()
+        def sender(receive):
+            addr = actor.spawn(drain, max_mailbox=3, overflow=overflow)
+            for i in range(count):
+                addr | i
+            return node.wait(addr)
+        return node.wait(node.spawn(sender))
+
+    def test_drop_newest(self):
+        self.assertEquals(self.fill(actor.DROP_NEWEST, 5), [0, 1, 2])
+
+    def test_drop_oldest(self):
+        self.assertEquals(self.fill(actor.DROP_OLDEST, 5), [2, 3, 4])
+
+    def test_raise(self):
+        self.assertRaises(actor.MailboxFull, self.fill, actor.RAISE, 5)
+
+    def test_block(self):
+        node = make_node()
+        def consumer(receive):
+            result = []
+            while len(result) < 10:
+                result.append(receive()[1])
+                gevent.sleep(0.001)
+            return result
+        def producer(receive):
+            addr = actor.spawn(consumer, max_mailbox=2)
+            consumer_actor = node.actors[addr.actor_id]
+            for i in range(10):
+                addr | i
+            return node.wait(addr), consumer_actor
+        result, consumer_actor = node.wait(node.spawn(producer))
+        self.assertEquals(result, range(10))
+        self.assertEquals(consumer_actor.mailbox_high_water, 2)
+
+    def test_invalid_policy(self):
+        node = make_node()
+        self.assertRaises(ValueError, node.spawn, foo, overflow='bogus')
+
+
+class TestUrgent(unittest.TestCase):
+
+    def test_urgent_first(self):
+        node = make_node()
+        def receiver(receive):
+            gevent.sleep(0.01)
+            return [receive()[1] for i in range(4)]
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            addr | 'data1'
+            addr.cast('control1', urgent=True)
+            addr | 'data2'
+            addr.cast('control2', urgent=True)
+            return node.wait(addr)
+        self.assertEquals(node.wait(node.spawn(sender)),
+                          ['control1', 'control2', 'data1', 'data2'])
+
+    def test_urgent_selective(self):
+        node = make_node()
+        def receiver(receive):
+            gevent.sleep(0.01)
+            return [receive({'b': int})[1] for i in range(2)]
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            addr | {'b': 1}
+            addr.cast({'a': 2}, urgent=True)
+            addr.cast({'b': 3}, urgent=True)
+            return node.wait(addr)
+        self.assertEquals(node.wait(node.spawn(sender)), [{'b': 3}, {'b': 1}])
+
+
+class TestEnvelope(unittest.TestCase):
+
+    def test_sender_and_trace_id(self):
+        node = make_node()
+        def receiver(receive):
+            gevent.sleep(0.02)
+            current = actor.curactor()
+            first = current.receive({'n': 2}, with_envelope=True)
+            second = current.receive(with_envelope=True)
+            return first, second, current.receive(
+                timeout=0, with_envelope=True)
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            addr | {'n': 1}
+            addr.cast({'n': 2}, trace_id='t1')
+            return node.wait(addr)
+        addr = node.spawn(sender)
+        first, second, last = node.wait(addr)
+        pattern, message, envelope = first
+        self.assertEquals(message, {'n': 2})
+        self.assertEquals(envelope.sender.actor_id, addr.actor_id)
+        self.assertEquals(envelope.trace_id, 't1')
+        self.assertTrue(envelope.queue_delay() >= 0.02)
+        self.assertEquals(second[1:], ({'n': 1}, second[2]))
+        self.assertEquals(second[2].trace_id, None)
+        self.assertEquals(last, (None, None, None))
+
+    def test_outside_actor(self):
+        node = make_node()
+        def receiver(receive):
+            return actor.curactor().receive_batch(with_envelope=True)
+        addr = node.spawn(receiver)
+        node.send(addr, 'hello', trace_id='t2')
+        [(pattern, message, envelope)] = node.wait(addr)
+        self.assertEquals((message, envelope.sender, envelope.trace_id),
+                          ('hello', None, 't2'))
+
+
+class TestReceiveBatch(unittest.TestCase):
+
+    def batch(self, receiver):
+        node = make_node()
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            # Keep the receiver around to wait for it once it is done.
+            receiver_actor = node.actors[addr.actor_id]
+            for i in range(5):
+                addr | {'n': i}
+            addr | 'x'
+            gevent.sleep(0.01)
+            addr | {'n': 5}
+            return node.wait(addr)
+        return node.wait(node.spawn(sender))
+
+    def test_max_items(self):
+        def receiver(receive):
+            gevent.sleep(0.005)
+            batch = actor.curactor().receive_batch({'n': int}, max_items=3)
+            return [msg['n'] for pat, msg in batch]
+        self.assertEquals(self.batch(receiver), [0, 1, 2])
+
+    def test_all_queued(self):
+        def receiver(receive):
+            gevent.sleep(0.005)
+            batch = actor.curactor().receive_batch({'n': int})
+            return [msg['n'] for pat, msg in batch]
+        self.assertEquals(self.batch(receiver), [0, 1, 2, 3, 4])
+
+    def test_linger(self):
+        def receiver(receive):
+            batch = actor.curactor().receive_batch({'n': int}, linger=0.1)
+            return [msg['n'] for pat, msg in batch]
+        self.assertEquals(self.batch(receiver), [0, 1, 2, 3, 4, 5])
+
+    def test_timeout(self):
+        def receiver(receive):
+            return actor.curactor().receive_batch({'z': int}, timeout=0.01)
+        self.assertEquals(self.batch(receiver), [])
+
+
+class TestScheduled(unittest.TestCase):
+
+    def test_send_after(self):
+        def main(receive):
+            start = time.time()
+            actor.send_after(0.05, actor.curaddr(), 'later')
+            pat, msg = receive(timeout=1)
+            return msg, time.time() - start >= 0.05
+        node = make_node()
+        self.assertEquals(node.wait(node.spawn(main)), ('later', True))
+
+    def test_cancel(self):
+        def main(receive):
+            handle = actor.send_after(0.02, actor.curaddr(), 'later')
+            handle.cancel()
+            return receive(timeout=0.1)
+        node = make_node()
+        self.assertEquals(node.wait(node.spawn(main)), (None, None))
+
+    def test_send_interval(self):
+        def main(receive):
+            handle = actor.send_interval(0.02, actor.curaddr(), 'tick')
+            ticks = [receive(timeout=1)[1] for i in range(3)]
+            handle.cancel()
+            return ticks, receive(timeout=0.1)
+        node = make_node()
+        self.assertEquals(node.wait(node.spawn(main)),
+                          (['tick'] * 3, (None, None)))
+
+    def test_ticker_sleeps(self):
+        node = make_node()
+        advances = []
+        advance = node._timers.advance
+        def counting(now=None):
+            advances.append(now)
+            return advance(now)
+        node._timers.advance = counting
+        def main(receive):
+            far = node.call_later(3600, lambda: None)
+            gevent.sleep(0.1)
+            start = time.time()
+            actor.send_after(0.02, actor.curaddr(), 'soon')
+            pat, msg = receive(timeout=3600)
+            far.cancel()
+            return msg, time.time() - start < 0.1
+        self.assertEquals(node.wait(node.spawn(main)), ('soon', True))
+        self.assertTrue(len(advances) < 5, len(advances))
+
+    def test_timer_error(self):
+        node = make_node()
+        errors, fired = [], []
+        hub = gevent.get_hub()
+        hub.handle_error = lambda context, *exc_info: errors.append(
+            exc_info[0])
+        try:
+            node.call_later(0.01, lambda: 1 / 0)
+            node.call_later(0.02, fired.append, 1)
+            gevent.sleep(0.05)
+        finally:
+            del hub.handle_error
+        self.assertEquals((errors, fired), ([ZeroDivisionError], [1]))
+
+    def test_full_mailbox(self):
+        def main(receive):
+            handle = actor.send_interval(0.01, actor.curaddr(), 'tick')
+            gevent.sleep(0.1)
+            handle.cancel()
+            return drain(receive)
+        node = make_node()
+        addr = node.spawn(main, max_mailbox=2)
+        self.assertEquals(node.wait(addr), ['tick', 'tick'])
+
+    def test_full_mailbox_elsewhere(self):
+        mesh = actor.Mesh()
+        node = actor.Node(mesh, 'a@localhost.local:3232')
+        other = actor.Node(mesh, 'b@localhost.local:3232')
+        def stuck(receive):
+            gevent.sleep(1)
+        addr = other.spawn(stuck, max_mailbox=1, overflow=actor.BLOCK)
+        def main(receive):
+            handle = actor.send_interval(0.01, addr, 'tick')
+            start = time.time()
+            receive(timeout=0.05)
+            handle.cancel()
+            return time.time() - start < 0.5
+        self.assertTrue(node.wait(node.spawn(main)))
+        other.actors[addr.actor_id].greenlet.kill()
+
+
+class Ping(actor.Record):
+    fields = ('sender', ('count', int))
+
+
+class TestIsolation(unittest.TestCase):
+
+    def roundtrip(self, isolation):
+        node = make_node(isolation=isolation)
+        message = {'items': [1, 2], 'address': None}
+        def receiver(receive):
+            return receive()[1]
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            message['address'] = addr
+            addr | message
+            message['items'].append(3)
+            return node.wait(addr)
+        return message, node.wait(node.spawn(sender))
+
+    def test_json(self):
+        sent, received = self.roundtrip(actor.JSON)
+        self.assertEquals(received['items'], [1, 2])
+        self.assertEquals(received['address'].actor_id,
+                          sent['address'].actor_id)
+
+    def test_deepcopy(self):
+        sent, received = self.roundtrip(actor.DEEPCOPY)
+        self.assertEquals(received['items'], [1, 2])
+        self.assertTrue(received['address'] is sent['address'])
+
+    def test_freeze(self):
+        sent, received = self.roundtrip(actor.FREEZE)
+        self.assertEquals(received['items'], (1, 2))
+        self.assertRaises(TypeError, received.__setitem__, 'items', None)
+
+    def test_trusted(self):
+        sent, received = self.roundtrip(actor.TRUSTED)
+        self.assertTrue(received is sent)
+
+    def test_invalid_policy(self):
+        self.assertRaises(ValueError, make_node, isolation='bogus')
+
+    def test_binary_attachment(self):
+        node = make_node()
+        def receiver(receive):
+            return receive()[1]
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            receiver_actor = node.actors[addr.actor_id]
+            addr | {'chunk': actor.Binary('\x00\xff' * 1024)}
+            return node.wait(addr)
+        received = node.wait(node.spawn(sender))['chunk']
+        self.assertEquals(received, actor.Binary('\x00\xff' * 1024))
+        self.assertTrue(isinstance(received.value, memoryview))
+        self.assertTrue(received.value.readonly)
+
+    def send_mutated_binary(self, isolation):
+        node = make_node(isolation=isolation)
+        data = bytearray('abc')
+        def receiver(receive):
+            return receive()[1]
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            receiver_actor = node.actors[addr.actor_id]
+            addr | {'blob': actor.Binary(data)}
+            data[0] = 'x'
+            return node.wait(addr)
+        return node.wait(node.spawn(sender))['blob']
+
+    def test_deepcopy_binary(self):
+        received = self.send_mutated_binary(actor.DEEPCOPY)
+        self.assertEquals(received, actor.Binary('abc'))
+        self.assertTrue(received.value.readonly)
+
+    def test_freeze_binary(self):
+        received = self.send_mutated_binary(actor.FREEZE)
+        self.assertEquals(received, actor.Binary('abc'))
+        self.assertTrue(received.value.readonly)
+
+    def test_freeze_record(self):
+        node = make_node(isolation=actor.FREEZE)
+        def receiver(receive):
+            gevent.sleep(0.01)
+            return receive(Ping)[1]
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            receiver_actor = node.actors[addr.actor_id]
+            ping = Ping([1], 1)
+            addr | ping
+            ping.count = 2
+            ping.sender.append(2)
+            return node.wait(addr)
+        received = node.wait(node.spawn(sender))
+        self.assertEquals(received, Ping((1,), 1))
+        self.assertRaises(TypeError, setattr, received, 'count', 3)
+
+    def test_lazy_decode(self):
+        node = make_node(lazy_decode=True)
+        def receiver(receive):
+            gevent.sleep(0.01)
+            return [receive({'n': 2})[1], receive()[1], receive()[1]]
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            receiver_actor = node.actors[addr.actor_id]
+            for i in range(3):
+                addr | {'n': i, 'items': (i,)}
+            return node.wait(addr)
+        self.assertEquals(node.wait(node.spawn(sender)),
+                          [{'n': 2, 'items': [2]}, {'n': 0, 'items': [0]},
+                           {'n': 1, 'items': [1]}])
+
+    def test_lazy_decode_as_json_obj(self):
+        class Report(object):
+            def _as_json_obj(self):
+                return {'kind': 'report', 'items': [1]}
+        node = make_node(lazy_decode=True)
+        def receiver(receive):
+            return receive({'kind': str}, timeout=1)[1]
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            receiver_actor = node.actors[addr.actor_id]
+            addr | Report()
+            return node.wait(addr)
+        self.assertEquals(node.wait(node.spawn(sender)),
+                          {'kind': 'report', 'items': [1]})
+
+    def test_record(self):
+        node = make_node()
+        def receiver(receive):
+            gevent.sleep(0.01)
+            return [receive(Ping.pattern(count=2))[1], receive(Ping)[1]]
+        def sender(receive):
+            addr = actor.spawn(receiver)
+            receiver_actor = node.actors[addr.actor_id]
+            addr | {'count': 2}
+            for i in range(3):
+                addr | Ping(actor.curaddr(), i)
+            return node.wait(addr)
+        first, second = node.wait(node.spawn(sender))
+        self.assertEquals((first.count, second.count), (2, 0))
+        self.assertTrue(isinstance(first.sender, actor.Address))
+
+    def test_lazy_decode_requires_json(self):
+        self.assertRaises(ValueError, make_node, isolation=actor.TRUSTED,
+                          lazy_decode=True)
+
+    def test_freeze_nested(self):
+        frozen = actor.freeze({'a': [{'b': set([1])}], 'c': (1, [2])})
+        self.assertEquals(frozen, {'a': ({'b': frozenset([1])},),
+                                   'c': (1, (2,))})
+        self.assertTrue(isinstance(frozen['a'][0], actor.FrozenDict))
+        self.assertEquals(hash(frozen['a'][0]),
+                          hash(actor.freeze({'b': set([1])})))
+
+
+class CountingCodec(codec.JSONCodec):
+    name = 'counting'
+    encoded = 0
+
+    def encode(self, message, attachments=None):
+        self.encoded += 1
+        return codec.JSONCodec.encode(self, message, attachments)
+
+
+class TestMulticast(unittest.TestCase):
+
+    def fanout(self, node, other, count):
+        def receiver(receive):
+            return receive()[1]
+        def sender(receive):
+            addrs = [actor.spawn(receiver) for i in range(count)]
+            addrs.append(other.spawn(receiver))
+            receivers = [actor.curactor().node.actors.get(addr.actor_id)
+                         or other.actors[addr.actor_id] for addr in addrs]
+            actor.Address.cast_many(addrs, {'news': [1, 2]})
+            return [each._get() for each in receivers]
+        return node.wait(node.spawn(sender))
+
+    def test_encoded_once(self):
+        wire = codec.register(CountingCodec())
+        mesh = actor.Mesh()
+        node = actor.Node(mesh, 'a@localhost.local:3232',
+                          wire_codec=wire.name)
+        other = actor.Node(mesh, 'b@localhost.local:3232')
+        received = self.fanout(node, other, 3)
+        self.assertEquals(received, [{'news': [1, 2]}] * 4)
+        self.assertEquals(wire.encoded, 1)
+        self.assertFalse(received[0] is received[1])
+
+    def test_frozen_shared(self):
+        mesh = actor.Mesh()
+        node = actor.Node(mesh, 'a@localhost.local:3232',
+                          isolation=actor.FREEZE)
+        other = actor.Node(mesh, 'b@localhost.local:3232')
+        received = self.fanout(node, other, 2)
+        self.assertEquals(received, [{'news': (1, 2)}] * 3)
+        self.assertTrue(received[0] is received[2])
+
+
+    def test_full_mailbox(self):
+        node = make_node()
+        def receiver(receive):
+            gevent.sleep(0.01)
+            return drain(receive)
+        def sender(receive):
+            full = actor.spawn(receiver, max_mailbox=1,
+                               overflow=actor.RAISE)
+            full | 'first'
+            addrs = [full] + [actor.spawn(receiver) for i in range(2)]
+            receivers = [node.actors[addr.actor_id] for addr in addrs]
+            try:
+                actor.Address.cast_many(addrs, 'news')
+            except actor.MailboxFull, e:
+                failed = list(e.args)
+            return failed == [full], [each._get() for each in receivers]
+        self.assertEquals(node.wait(node.spawn(sender)),
+                          (True, [['first'], ['news'], ['news']]))
+
+
+class EchoServer(actor.Server):
+
+    def echo(self, message):
+        return message
+
+    def fail(self, message):
+        raise ValueError(message)
+
+    def slow(self, delay):
+        gevent.sleep(delay)
+        return delay
+
+
+class GatewayServer(EchoServer):
+    max_concurrency = 4
+    serial_methods = ('ordered', 'interrupted')
+
+    def ordered(self, delay):
+        gevent.sleep(delay)
+        return time.time()
+
+    def interrupted(self, message):
+        if message is None:
+            raise GreenletExit()
+        return message
+
+    def forward(self, server):
+        return server.slow(0.01)
+
+
+class LookupServer(actor.Server):
+
+    def __init__(self, *args, **kw):
+        actor.Server.__init__(self, *args, **kw)
+        self.calls = 0
+
+    @actor.memoize(maxsize=2, invalidate={'invalidate': 'lookup'})
+    def lookup(self, key):
+        self.calls += 1
+        return {'key': key, 'calls': self.calls}
+
+    @actor.memoize(invalidate={'invalidate': 'lookup'})
+    def reverse(self, key):
+        self.calls += 1
+        return {'key': key[::-1], 'calls': self.calls}
+
+    @actor.memoize(ttl=0.02)
+    def fresh(self, key):
+        self.calls += 1
+        return self.calls
+
+    def stats(self, name):
+        return [self.caches[name].hits, self.caches[name].misses,
+                self.calls]
+
+
+class StoreServer(actor.Server):
+    max_concurrency = 8
+    coalesce_methods = ('load',)
+
+    def __init__(self, *args, **kw):
+        actor.Server.__init__(self, *args, **kw)
+        self.loads = 0
+
+    def load(self, key):
+        self.loads += 1
+        gevent.sleep(0.02)
+        if key == 'missing':
+            raise KeyError(key)
+        return {'key': key, 'load': self.loads}
+
+    def stats(self, message):
+        return [self.loads, self.coalesced]
+
+
+class WriterServer(actor.Server):
+
+    def __init__(self, *args, **kw):
+        actor.Server.__init__(self, *args, **kw)
+        self.batches = []
+
+    @actor.batched(max_items=3, linger=0.03)
+    def write(self, items):
+        self.batches.append(len(items))
+        return [item * 2 for item in items]
+
+    @actor.batched()
+    def broken(self, items):
+        return []
+
+    def stats(self, message):
+        return self.batches
+
+
+class TestCall(unittest.TestCase):
+
+    def test_reply_skips_mailbox(self):
+        node = make_node()
+        def caller(receive, server):
+            current = actor.curactor()
+            for i in range(100):
+                current.address | {'backlog': i}
+            gevent.sleep(0)
+            result = server.echo({'n': 1})
+            return result, len(current._mailbox), len(current._urgent)
+        server = node.spawn(EchoServer)
+        self.assertEquals(node.wait(node.spawn(caller, server)),
+                          ({'n': 1}, 100, 0))
+
+    def test_long_ids(self):
+        node = make_node()
+        # As on platforms where a C long has 32 bits.
+        node._ids = itertools.count(sys.maxint + 1)
+        def caller(receive, server):
+            return server.echo({'n': 1}, timeout=1)
+        server = node.spawn(EchoServer)
+        self.assertTrue(isinstance(server.actor_id, long))
+        self.assertEquals(node.wait(node.spawn(caller, server)), {'n': 1})
+
+    def test_errors(self):
+        node = make_node()
+        def caller(receive, server):
+            errors = []
+            for method in ('fail', 'bogus'):
+                try:
+                    server.call(method, 'x')
+                except actor.ActorError, e:
+                    errors.append(type(e))
+            return errors, actor.curactor()._replies
+        server = node.spawn(EchoServer)
+        self.assertEquals(
+            node.wait(node.spawn(caller, server)),
+            ([actor.RemoteException, actor.RemoteAttributeError], {}))
+
+    def test_gather(self):
+        node = make_node()
+        def caller(receive, servers):
+            start = time.time()
+            futures = [server.call_async('slow', 0.05) for server in servers]
+            results = actor.gather(futures, timeout=1)
+            return results, time.time() - start
+        servers = [node.spawn(EchoServer) for i in range(5)]
+        results, elapsed = node.wait(node.spawn(caller, servers))
+        self.assertEquals(results, [0.05] * 5)
+        self.assertTrue(elapsed < 0.2, elapsed)
+
+    def test_gather_errors(self):
+        node = make_node()
+        def caller(receive, server):
+            futures = [server.call_async('echo', 1),
+                       server.call_async('fail', 2)]
+            self.assertRaises(actor.RemoteException, actor.gather, futures)
+            slow = server.call_async('slow', 0.5)
+            self.assertRaises(gevent.Timeout, actor.gather, [slow],
+                              timeout=0.02)
+            self.assertFalse(slow.done())
+            return futures[0].result()
+        server = node.spawn(EchoServer)
+        self.assertEquals(node.wait(node.spawn(caller, server)), 1)
+
+    def test_as_completed(self):
+        node = make_node()
+        def caller(receive, servers):
+            futures = [server.call_async('slow', delay) for server, delay
+                       in zip(servers, (0.06, 0.02, 0.04))]
+            return [future.result() for future
+                    in actor.as_completed(futures, timeout=1)]
+        servers = [node.spawn(EchoServer) for i in range(3)]
+        self.assertEquals(node.wait(node.spawn(caller, servers)),
+                          [0.02, 0.04, 0.06])
+
+    def test_late_reply_discarded(self):
+        node = make_node()
+        def caller(receive, server):
+            current = actor.curactor()
+            self.assertRaises(gevent.Timeout, server.slow, 0.05,
+                              timeout=0.01)
+            self.assertEquals(current.late_replies, 0)
+            gevent.sleep(0.1)
+            return current.late_replies, len(current._urgent), \
+                current._abandoned
+        server = node.spawn(EchoServer)
+        self.assertEquals(node.wait(node.spawn(caller, server)),
+                          (1, 0, set()))
+
+    def test_abandoned_calls_bounded(self):
+        node = make_node()
+        def caller(receive, server):
+            current = actor.curactor()
+            current.max_abandoned_calls = 2
+            for i in range(3):
+                server.call_async('slow', 0.02).cancel()
+            gevent.sleep(0.1)
+            return current.late_replies, len(current._urgent)
+        server = node.spawn(EchoServer)
+        self.assertEquals(node.wait(node.spawn(caller, server)), (2, 1))
+
+    def test_unknown_reply_is_queued(self):
+        node = make_node()
+        def caller(receive, server):
+            actor.curaddr().cast({'response': 1, 'message': 'stray'})
+            server.echo(None)
+            return receive(actor.RESPONSE_PATTERN)[1]
+        server = node.spawn(EchoServer)
+        self.assertEquals(node.wait(node.spawn(caller, server)),
+                          {'response': 1, 'message': 'stray'})
+
+
+class TestConcurrentServer(unittest.TestCase):
+
+    def timed(self, server_type, method, delays):
+        node = make_node()
+        def caller(receive, server):
+            start = time.time()
+            results = actor.gather([server.call_async(method, delay)
+                                    for delay in delays], timeout=1)
+            return results, time.time() - start
+        server = node.spawn(server_type)
+        return node.wait(node.spawn(caller, server))
+
+    def test_serial_by_default(self):
+        results, elapsed = self.timed(EchoServer, 'slow', [0.03] * 3)
+        self.assertTrue(elapsed >= 0.09, elapsed)
+
+    def test_concurrent(self):
+        results, elapsed = self.timed(GatewayServer, 'slow', [0.05] * 4)
+        self.assertEquals(results, [0.05] * 4)
+        self.assertTrue(elapsed < 0.1, elapsed)
+
+    def test_bounded(self):
+        results, elapsed = self.timed(GatewayServer, 'slow', [0.03] * 8)
+        self.assertTrue(0.06 <= elapsed < 0.09, elapsed)
+
+    def test_serial_method(self):
+        results, elapsed = self.timed(GatewayServer, 'ordered',
+                                      [0.03, 0.01, 0.02])
+        self.assertEquals(results, sorted(results))
+        self.assertTrue(elapsed >= 0.06, elapsed)
+
+    def test_serial_method_interrupted(self):
+        node = make_node()
+        def caller(receive, server):
+            server.call_async('interrupted')
+            gevent.sleep(0.01)
+            return server.interrupted('done', timeout=1)
+        server = node.spawn(GatewayServer)
+        self.assertEquals(node.wait(node.spawn(caller, server)), 'done')
+
+    def test_errors_and_nested_calls(self):
+        node = make_node()
+        def caller(receive, gateway, echo):
+            futures = [gateway.call_async('fail', 1),
+                       gateway.call_async('forward', echo),
+                       gateway.call_async('bogus')]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result(timeout=1))
+                except actor.ActorError, e:
+                    results.append(type(e))
+            return results
+        gateway, echo = node.spawn(GatewayServer), node.spawn(EchoServer)
+        self.assertEquals(
+            node.wait(node.spawn(caller, gateway, echo)),
+            [actor.RemoteException, 0.01, actor.RemoteAttributeError])
+
+
+class TestMemoize(unittest.TestCase):
+
+    def run_caller(self, caller):
+        node = make_node()
+        server = node.spawn(LookupServer)
+        return node.wait(node.spawn(caller, server))
+
+    def test_hits(self):
+        def caller(receive, server):
+            results = [server.lookup(key) for key in ('a', 'b', 'a')]
+            return results, server.stats('lookup')
+        results, stats = self.run_caller(caller)
+        self.assertEquals([result['calls'] for result in results], [1, 2, 1])
+        self.assertEquals(stats, [1, 2, 2])
+
+    def test_lru(self):
+        def caller(receive, server):
+            for key in ('a', 'b', 'c', 'a'):
+                server.lookup(key)
+            return server.stats('lookup')
+        self.assertEquals(self.run_caller(caller), [0, 4, 4])
+
+    def test_ttl(self):
+        def caller(receive, server):
+            results = [server.fresh(1), server.fresh(1)]
+            gevent.sleep(0.03)
+            return results + [server.fresh(1)]
+        self.assertEquals(self.run_caller(caller), [1, 1, 2])
+
+    def test_invalidate(self):
+        def caller(receive, server):
+            first = server.lookup('a')
+            server | {'invalidate': 'lookup'}
+            server | {'invalidate': 'other'}
+            return first, server.lookup('a'), server.stats('lookup')
+        first, second, stats = self.run_caller(caller)
+        self.assertEquals((first['calls'], second['calls']), (1, 2))
+        self.assertEquals(stats, [0, 2, 2])
+
+    def test_invalidate_equal_patterns(self):
+        def caller(receive, server):
+            before = [server.lookup('ab'), server.reverse('ab')]
+            server | {'invalidate': 'lookup'}
+            after = [server.lookup('ab'), server.reverse('ab')]
+            return [result['calls'] for result in before + after]
+        self.assertEquals(self.run_caller(caller), [1, 2, 3, 4])
+
+    def test_uncacheable(self):
+        node = make_node(isolation=actor.TRUSTED)
+        server = node.spawn(LookupServer)
+        circular = []
+        circular.append(circular)
+        def caller(receive, server):
+            results = [server.lookup(key)['calls']
+                       for key in ('\xff', '\xff', circular)]
+            return results, server.stats('lookup')
+        self.assertEquals(node.wait(node.spawn(caller, server)),
+                          ([1, 2, 3], [0, 0, 3]))
+
+
+class TestCoalesce(unittest.TestCase):
+
+    def test_identical_calls(self):
+        node = make_node()
+        def caller(receive, server):
+            futures = [server.call_async('load', key)
+                       for key in ('a', 'a', 'b', 'a', 'missing', 'missing')]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result(timeout=1)['key'])
+                except actor.RemoteException:
+                    results.append(None)
+            return results, server.stats()
+        server = node.spawn(StoreServer)
+        results, stats = node.wait(node.spawn(caller, server))
+        self.assertEquals(results, ['a', 'a', 'b', 'a', None, None])
+        self.assertEquals(stats, [3, 3])
+
+    def test_key_order(self):
+        node = make_node(isolation=actor.TRUSTED)
+        # 'a' and 'i' collide in a small dict, so the order they were
+        # added in shows in the encoded message.
+        first, second = {}, {}
+        for key in ('a', 'i'):
+            first[key] = {'n': [1]}
+        for key in ('i', 'a'):
+            second[key] = {'n': [1]}
+        def caller(receive, server):
+            futures = [server.call_async('load', key)
+                       for key in (first, second)]
+            return ([future.result(timeout=1)['load'] for future in futures],
+                    server.stats())
+        server = node.spawn(StoreServer)
+        self.assertEquals(node.wait(node.spawn(caller, server)),
+                          ([1, 1], [1, 1]))
+
+    def test_after_completion(self):
+        node = make_node()
+        def caller(receive, server):
+            return [server.load('a')['load'] for i in range(2)]
+        server = node.spawn(StoreServer)
+        self.assertEquals(node.wait(node.spawn(caller, server)), [1, 2])
+
+
+class TestBatched(unittest.TestCase):
+
+    def test_batches(self):
+        node = make_node()
+        def caller(receive, server):
+            start = time.time()
+            results = actor.gather([server.call_async('write', i)
+                                    for i in range(5)], timeout=1)
+            return results, server.stats(), time.time() - start
+        server = node.spawn(WriterServer)
+        results, batches, elapsed = node.wait(node.spawn(caller, server))
+        self.assertEquals(results, [0, 2, 4, 6, 8])
+        self.assertEquals(batches, [3, 2])
+        self.assertTrue(0.03 <= elapsed < 0.1, elapsed)
+
+    def test_other_methods_not_delayed(self):
+        node = make_node()
+        def caller(receive, server):
+            pending = server.call_async('write', 1)
+            start = time.time()
+            batches = server.stats()
+            return batches, time.time() - start, pending.result(timeout=1)
+        server = node.spawn(WriterServer)
+        batches, elapsed, result = node.wait(node.spawn(caller, server))
+        self.assertEquals((batches, result), ([], 2))
+        self.assertTrue(elapsed < 0.02, elapsed)
+
+    def test_stopped(self):
+        node = make_node()
+        def caller(receive, server):
+            pending = server.call_async('write', 1)
+            gevent.sleep(0.01)
+            node.actors[server.actor_id].greenlet.kill()
+            start = time.time()
+            self.assertRaises(actor.RemoteException, pending.result,
+                              timeout=1)
+            return time.time() - start
+        server = node.spawn(WriterServer)
+        elapsed = node.wait(node.spawn(caller, server))
+        self.assertTrue(elapsed < 0.1, elapsed)
+
+    def test_wrong_number_of_results(self):
+        node = make_node()
+        def caller(receive, server):
+            self.assertRaises(actor.RemoteException, server.broken, 1)
+        server = node.spawn(WriterServer)
+        node.wait(node.spawn(caller, server))
+
+
 THE_RESULT = "This is the result"
 
 
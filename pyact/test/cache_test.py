@@ -0,0 +1,74 @@
+"""\
+Copyright (c) 2009, Donovan Preston.
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import unittest
+
+from pyact import cache
+
+
+class Clock(object):
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = cache.LRUCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_get(self):
+        self.cache.put('a', 1)
+        self.assertEquals(self.cache.get('a'), 1)
+        self.assertEquals(self.cache.get('b', 2), 2)
+        self.assertEquals((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_least_recently_used(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.get('a')
+        self.cache.put('c', 3)
+        self.assertTrue('a' in self.cache)
+        self.assertFalse('b' in self.cache)
+        self.assertEquals(len(self.cache), 2)
+
+    def test_ttl(self):
+        self.cache.put('a', 1)
+        self.clock.now += 5
+        self.cache.put('b', 2)
+        self.clock.now += 5
+        self.assertEquals(self.cache.get('a'), None)
+        self.assertEquals(self.cache.get('b'), 2)
+        self.assertEquals(len(self.cache), 1)
+
+    def test_clear(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.discard('a')
+        self.assertFalse('a' in self.cache)
+        self.cache.clear()
+        self.assertEquals(len(self.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+"""\
+Copyright (c) 2009, Donovan Preston.
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import copy
+import unittest
+
+from pyact import codec
+from pyact.record import Record
+
+
+class Point(object):
+
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+    def __eq__(self, other):
+        return (self.x, self.y) == (other.x, other.y)
+
+
+class Move(Record):
+    fields = ('piece', 'to')
+
+
+class Report(object):
+
+    def __init__(self, text):
+        self.text = text
+
+    def _as_json_obj(self):
+        return {'report': self.text}
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_json_available(self):
+        self.assertTrue(codec.JSON in codec.available())
+        self.assertEquals(codec.get(codec.JSON).name, codec.JSON)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, codec.get, 'bogus')
+
+
+class TestJSONCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = codec.JSONCodec()
+        self.codec.register_type(Point, '_point', lambda p: [p.x, p.y],
+                                 lambda value: Point(*value))
+
+    def roundtrip(self, message):
+        return self.codec.decode(self.codec.encode(message))
+
+    def test_plain(self):
+        message = {'a': [1, 2.5, None, True], 'b': {'c': 'd'}}
+        self.assertEquals(self.roundtrip(message), message)
+
+    def test_extension_type(self):
+        message = {'at': Point(1, 2), 'path': [Point(3, 4)]}
+        self.assertEquals(self.roundtrip(message), message)
+
+    def test_single_member_object(self):
+        self.assertEquals(self.roundtrip({'_other': 1}), {'_other': 1})
+
+    def test_unknown_type(self):
+        self.assertRaises(TypeError, self.codec.encode, object())
+
+    def test_record(self):
+        message = {'moves': [Move('pawn', Point(1, 2)), Move(None, 3)]}
+        self.assertEquals(self.roundtrip(message), message)
+
+    def test_record_attachments(self):
+        message = Move(codec.Binary('\x00' * 10), [codec.Binary('x')])
+        data, attachments = self.codec.pack(message)
+        self.assertEquals(len(attachments), 2)
+        self.assertEquals(self.codec.unpack((data, attachments)), message)
+
+    def test_record_header(self):
+        header = self.codec.header(Move('pawn', {'x': 1}))
+        self.assertEquals(header, Move(u'pawn', {}))
+
+    def test_as_json_obj(self):
+        self.assertEquals(self.roundtrip([Report(u'ok')]),
+                          [{'report': 'ok'}])
+
+    def test_lazy(self):
+        message = {'tag': 'x', 'at': Point(1, 2), 'items': ('a', [1])}
+        lazy = self.codec.lazy(message)
+        self.assertTrue(isinstance(lazy, codec.LazyMessage))
+        self.assertEquals(lazy.header, {'tag': 'x', 'at': Point(1, 2),
+                                        'items': []})
+        self.assertEquals(lazy.decode(), self.roundtrip(message))
+
+    def test_as_json_obj_header(self):
+        self.assertEquals(self.codec.header(Report('ok')), {'report': 'ok'})
+        self.assertEquals(self.codec.header([Report('ok')]), [{}])
+
+    def test_binary_inline(self):
+        message = {'blob': codec.Binary('\x00\xff')}
+        self.assertEquals(self.roundtrip(message), message)
+
+    def test_attachments(self):
+        data = '\x00\xff' * 10
+        message = {'blob': codec.Binary(data), 'n': 1}
+        data_frames = self.codec.pack(message)
+        self.assertEquals(len(data_frames[1]), 1)
+        self.assertFalse(data in data_frames[0])
+        received = self.codec.unpack(data_frames)
+        self.assertEquals(received, message)
+        self.assertTrue(received['blob'].value.readonly)
+
+    def test_mutable_attachment(self):
+        data = bytearray('abc')
+        received = self.codec.unpack(self.codec.pack(codec.Binary(data)))
+        data[0] = 'x'
+        self.assertEquals(received, codec.Binary('abc'))
+
+    def test_copy(self):
+        text = codec.Binary('abc')
+        self.assertTrue(copy.deepcopy(text) is text)
+        data = bytearray('abc')
+        copied = copy.deepcopy(codec.Binary(data))
+        data[0] = 'x'
+        self.assertEquals(copied, codec.Binary('abc'))
+
+    def test_frames(self):
+        message = {'blobs': [codec.Binary('a' * 100), codec.Binary('')],
+                   'at': Point(1, 2)}
+        frames = self.codec.encode_frames(message)
+        data = ''.join(str(frame) if isinstance(frame, str)
+                       else frame.tobytes() for frame in frames)
+        self.assertTrue('a' * 100 in data)
+        self.assertEquals(self.codec.decode_frames(data), message)
+
+    def test_header(self):
+        self.assertEquals(self.codec.header(('a', {'b': 1}, 2)),
+                          ['a', {}, 2])
+        self.assertEquals(self.codec.header('text'), 'text')
+
+
+    def test_header_as_decoded(self):
+        header = self.codec.header({'name': '\xc3\xa9'})
+        self.assertEquals(header, {u'name': u'\xe9'})
+        self.assertEquals(type(header.keys()[0]), unicode)
+
+    def test_integer_keys(self):
+        # Member names become strings, so the header can not be told.
+        self.assertEquals(self.codec.header({1: 'a'}), None)
+        self.assertEquals(self.codec.lazy({1: 'a'}), {'1': 'a'})
+
+
+class TestMsgpackCodec(TestJSONCodec):
+
+    def setUp(self):
+        if codec.MSGPACK not in codec.available():
+            self.skipTest("msgpack is not installed")
+        self.codec = codec.MsgpackCodec()
+        self.codec.register_type(Point, 1, lambda p: (p.x, p.y),
+                                 lambda value: Point(*value))
+
+    def test_header_as_decoded(self):
+        self.assertEquals(self.codec.header({'name': '\xc3\xa9'}),
+                          {'name': '\xc3\xa9'})
+
+    def test_integer_keys(self):
+        self.assertEquals(self.codec.header({1: 'a'}), {1: 'a'})
+
+    def test_bytes(self):
+        self.assertEquals(self.roundtrip(['\x00\xff', u'text']),
+                          ['\x00\xff', u'text'])
+
+
+if __name__ == '__main__':
+    unittest.main()
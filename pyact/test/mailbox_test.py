@@ -0,0 +1,213 @@
+"""\
+Copyright (c) 2009, Donovan Preston.
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import unittest
+
+from pyact import codec, mailbox
+from pyact.record import Record
+
+
+class Move(Record):
+    fields = ('piece', 'to')
+
+
+def filled(*messages):
+    box = mailbox.Mailbox()
+    for message in messages:
+        box.append(message)
+    return box
+
+
+class TestMailbox(unittest.TestCase):
+    mode = 'static'
+
+    def test_popleft(self):
+        box = filled(1, 2, 3)
+        self.assertEquals(len(box), 3)
+        self.assertEquals(box.popleft(), 1)
+        self.assertEquals(box.popleft(), 2)
+        self.assertEquals(box.popleft(), 3)
+        self.assertRaises(IndexError, box.popleft)
+
+    def test_high_water(self):
+        box = filled(1, 2, 3)
+        box.popleft()
+        box.popleft()
+        box.append(4)
+        self.assertEquals(len(box), 2)
+        self.assertEquals(box.high_water, 3)
+
+    def test_select_in_order(self):
+        box = filled(('a', 1), ('b', 2), ('a', 3))
+        pattern = ('a', int)
+        self.assertEquals(box.select((pattern,)), (pattern, ('a', 1)))
+        self.assertEquals(box.select((pattern,)), (pattern, ('a', 3)))
+        self.assertEquals(box.select((pattern,)), (None, None))
+        self.assertEquals(box.popleft(), ('b', 2))
+        self.assertEquals(len(box), 0)
+
+    def test_select_unindexed(self):
+        box = filled(1, 'x', ('a', 1))
+        self.assertEquals(box.select((str,)), (str, 'x'))
+        self.assertEquals(box.select(((str, int),)), ((str, int), ('a', 1)))
+        self.assertEquals(box.popleft(), 1)
+
+    def test_select_response(self):
+        box = filled(*[{'data': i} for i in range(100)])
+        box.append({'response': 'b', 'message': 2})
+        box.append({'response': 'a', 'message': 1})
+        box.append({'response': 'a', 'exception': 3})
+        RSP = {'response': 'a', 'message': object}
+        EXC = {'response': 'a', 'exception': object}
+        self.assertEquals(box.select((RSP, EXC)),
+                          (RSP, {'response': 'a', 'message': 1}))
+        self.assertEquals(box.select((RSP, EXC)),
+                          (EXC, {'response': 'a', 'exception': 3}))
+        self.assertEquals(box.select((RSP, EXC)), (None, None))
+        self.assertEquals(len(box), 101)
+
+    def test_select_many_tags(self):
+        box = filled(('b', 1), ('c', 2), ('a', 3))
+        self.assertEquals(box.select((('a', int), ('b', int)))[1], ('b', 1))
+        self.assertEquals(box.select((('a', int), ('b', int)))[1], ('a', 3))
+        self.assertEquals(box.popleft(), ('c', 2))
+
+    def test_select_after(self):
+        box = filled(('a', 1), ('b', 2))
+        last = box.last
+        self.assertEquals(box.select((('b', int),), last), (None, None))
+        box.append(('b', 3))
+        self.assertEquals(box.select((('b', int),), last)[1], ('b', 3))
+        self.assertEquals(box.select((('b', int),))[1], ('b', 2))
+
+    def test_select_many(self):
+        box = filled(('a', 1), ('b', 2), ('a', 3), ('a', 4), 5)
+        pattern = ('a', int)
+        self.assertEquals(box.select_many((pattern,), limit=2),
+                          [(pattern, ('a', 1)), (pattern, ('a', 3))])
+        self.assertEquals(box.select_many((pattern, int)),
+                          [(pattern, ('a', 4)), (int, 5)])
+        self.assertEquals(box.select_many((pattern,)), [])
+        self.assertEquals(box.popleft(), ('b', 2))
+
+    def test_select_many_indexed_twice(self):
+        box = filled({'response': 1, 'call': 2}, {'call': 2},
+                     {'response': 1, 'call': 3})
+        RSP, CALL = {'response': 1}, {'call': 2}
+        self.assertEquals(box.select_many((RSP, CALL)),
+                          [(RSP, {'response': 1, 'call': 2}),
+                           (CALL, {'call': 2}),
+                           (RSP, {'response': 1, 'call': 3})])
+        self.assertEquals(len(box), 0)
+
+    def test_index_cleanup(self):
+        box = filled(('a', 1), ('a', 2), ('a', 3))
+        self.assertEquals(box.select((('a', 2),))[1], ('a', 2))
+        self.assertEquals(box.popleft(), ('a', 1))
+        self.assertEquals(box.popleft(), ('a', 3))
+        self.assertEquals(box._index, {})
+
+    def test_compaction(self):
+        box = filled('head')
+        for i in range(1000):
+            box.append(i)
+            box.select((int,))
+        self.assertTrue(len(box._order) < 200)
+        self.assertEquals(box.popleft(), 'head')
+
+    def test_envelopes(self):
+        box = mailbox.Mailbox()
+        first = mailbox.Envelope('sender', 1.0, 'trace')
+        box.append(('a', 1), first)
+        box.append(('b', 2))
+        box.append(('a', 3), mailbox.Envelope(None, 2.0))
+        self.assertEquals(box.select((('b', int),), with_envelope=True),
+                          (('b', int), ('b', 2), None))
+        self.assertEquals(box.popleft(with_envelope=True), (('a', 1), first))
+        [(pattern, message, envelope)] = box.select_many(
+            (object,), with_envelope=True)
+        self.assertEquals((message, envelope.enqueued), (('a', 3), 2.0))
+        self.assertEquals(box.select((object,), with_envelope=True),
+                          (None, None, None))
+        self.assertEquals(box._envelopes, {})
+
+
+
+class CountingCodec(codec.JSONCodec):
+    decoded = 0
+
+    def decode(self, data, attachments=None):
+        self.decoded += 1
+        return codec.JSONCodec.decode(self, data, attachments)
+
+
+class TestLazyMessages(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = CountingCodec()
+        self.box = filled(*[self.codec.lazy(message) for message in (
+            {'event': 'a', 'data': ['x']},
+            {'event': 'b', 'data': [1, 2]},
+            {'response': 'id1', 'message': 'ok'},
+            ['tag', 3])])
+
+    def test_header_rules_out(self):
+        self.assertEquals(self.box.select(({'event': 'c'},)), (None, None))
+        self.assertEquals(self.box.select(([int],)), (None, None))
+        self.assertEquals(self.codec.decoded, 0)
+
+    def test_select_decodes_match(self):
+        pattern = {'event': str, 'data': [int]}
+        self.assertEquals(self.box.select((pattern,)),
+                          (pattern, {'event': 'b', 'data': [1, 2]}))
+        # The first message passes on its header but not once decoded.
+        self.assertEquals(self.codec.decoded, 2)
+        self.assertEquals(len(self.box), 3)
+
+    def test_indexed(self):
+        pattern = {'response': 'id1', 'message': object}
+        self.assertEquals(self.box.select((pattern,)),
+                          (pattern, {'response': 'id1', 'message': 'ok'}))
+        self.assertEquals(self.codec.decoded, 1)
+        self.assertEquals(self.box._index, {})
+
+    def test_popleft_decodes(self):
+        self.assertEquals(self.box.popleft(), {'event': 'a', 'data': ['x']})
+
+    def test_record(self):
+        self.box.append(self.codec.lazy(Move('pawn', [1, 2])))
+        self.assertEquals(self.box.select((Move.pattern(to=[str]),)),
+                          (None, None))
+        self.assertEquals(self.codec.decoded, 1)
+        pattern = Move.pattern(to=[int])
+        self.assertEquals(self.box.select((pattern,)),
+                          (pattern, Move('pawn', [1, 2])))
+
+    def test_select_many(self):
+        pattern = {'event': object}
+        self.assertEquals(self.box.select_many((pattern,)),
+                          [(pattern, {'event': 'a', 'data': ['x']}),
+                           (pattern, {'event': 'b', 'data': [1, 2]})])
+        self.assertEquals(self.codec.decoded, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
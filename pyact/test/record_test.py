@@ -0,0 +1,95 @@
+"""\
+Copyright (c) 2009, Donovan Preston.
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import copy
+import pickle
+import unittest
+
+from pyact import record
+from pyact.record import Record
+
+
+class Move(Record):
+    fields = ('piece', ('to', (int, int)))
+
+
+class Capture(Move):
+    fields = ('taken',)
+
+
+class Tagged(Record):
+    tag = 'tagged'
+    fields = ('value',)
+
+
+class TestRecord(unittest.TestCase):
+
+    def test_fields(self):
+        move = Move('pawn', to=(4, 3))
+        self.assertEquals((move.piece, move.to), ('pawn', (4, 3)))
+        self.assertEquals(move.values(), ['pawn', (4, 3)])
+        self.assertEquals(Move.from_values(['pawn', (4, 3)]), move)
+        self.assertFalse(hasattr(move, '__dict__'))
+
+    def test_bad_fields(self):
+        self.assertRaises(TypeError, Move, 'pawn', (4, 3), 1)
+        self.assertRaises(TypeError, Move, 'pawn')
+        self.assertRaises(TypeError, Move, 'pawn', (4, 3), bogus=1)
+
+    def test_inherited_fields(self):
+        capture = Capture('rook', (1, 1), 'pawn')
+        self.assertEquals(Capture._names, ('piece', 'to', 'taken'))
+        self.assertNotEquals(capture, Move('rook', (1, 1)))
+        self.assertEquals(capture._as_json_obj(),
+                          {'piece': 'rook', 'to': (1, 1), 'taken': 'pawn'})
+
+    def test_tags(self):
+        self.assertEquals(Move.tag, __name__ + '.Move')
+        self.assertTrue(record.lookup(Move.tag) is Move)
+        self.assertTrue(record.lookup('tagged') is Tagged)
+        self.assertRaises(ValueError, record.lookup, 'bogus')
+
+    def test_pattern(self):
+        self.assertEquals(Move.pattern(), Move(object, (int, int)))
+        self.assertEquals(Move.pattern(piece=str), Move(str, (int, int)))
+
+    def test_copy(self):
+        move = Move('pawn', [4, 3])
+        for copied in (copy.deepcopy(move), pickle.loads(pickle.dumps(move))):
+            self.assertEquals(copied, move)
+            self.assertFalse(copied.to is move.to)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+    def test_frozen(self):
+        move = Move('pawn', [4, 3])
+        frozen = move.frozen(tuple)
+        self.assertEquals(frozen, Move('pawn', (4, 3)))
+        self.assertTrue(isinstance(frozen, Move))
+        self.assertRaises(TypeError, setattr, frozen, 'piece', 'rook')
+        self.assertTrue(frozen.frozen() is frozen)
+        self.assertTrue(record.lookup(Move.tag) is Move)
+        for copied in (copy.deepcopy(frozen),
+                       pickle.loads(pickle.dumps(frozen))):
+            self.assertEquals(copied, frozen)
+            self.assertRaises(TypeError, setattr, copied, 'piece', 'rook')
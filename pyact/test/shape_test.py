@@ -22,6 +22,15 @@ THE SOFTWARE.
 import unittest
 
 from pyact import shape
+from pyact.record import Record
+
+
+class Move(Record):
+    fields = ('piece', ('to', (int, int)))
+
+
+class Capture(Move):
+    fields = ('taken',)
 
 
 class TestShaped(unittest.TestCase):
@@ -157,6 +166,103 @@ class TestShaped(unittest.TestCase):
             {'hello': 'world'}, {'hello': 'something'})
 
 
+class TestCompiled(unittest.TestCase):
+    mode = 'static'
+    cases = [
+        ("hello", str), (u"hello", str), ("hello", u"hello"),
+        (1, int), (True, int), (1, bool), (1, 2), (1, 1), (1, True),
+        (str, "z"), (int, int), (int, object), (None, None),
+        ([1, 2, 3], [int]), ([1, 'a'], [int]), (set([8, 9]), set([int])),
+        (['x'], set(['x'])), (set(['x']), [str]), (7, ['a', 'b']),
+        ({'a': 'b', 'c': 5}, {'a': str, 'c': int}),
+        ({'a': 'b'}, {'a': str, 'c': int}), (1, {'a': 100}),
+        ((1, 'a'), (int, str)), ((1, 2, 3), (int, int)),
+        ([1, 2, 3], (int, int, int)), ((1, 'a'), ('x', str)),
+        ({'hello': 1, 'world': [{'abc': 'def'}, {'abc': 'def'}]},
+         {'hello': int, 'world': [{'abc': str}]}),
+        ({'hello': 'world'}, {'hello': 'something'}),
+        ({'any': object()}, {'any': object}),
+    ]
+
+    def test_same_as_is_shaped(self):
+        for thing, pattern in self.cases:
+            self.assertEquals(
+                shape.compile(pattern)(thing),
+                shape.is_shaped(thing, pattern),
+                (thing, pattern))
+
+    def test_cached(self):
+        pattern = {'foo': int}
+        self.assertTrue(shape.compile(pattern) is shape.compile(pattern))
+        self.assertFalse(shape.compile(pattern) is shape.compile({'foo': int}))
+
+
+class TestCompiledMany(unittest.TestCase):
+    mode = 'static'
+    patterns = (
+        ('connect', str, str, int), ('forget', str), ('node_up', str),
+        (str, str), {'exit': object, 'address': object},
+        {'response': 'a', 'message': object},
+        {'response': 'a', 'exception': object},
+        {'response': str, 'invalid_method': str}, [int], int, object)
+
+    def first_match(self, thing):
+        for index, pattern in enumerate(self.patterns):
+            if shape.is_shaped(thing, pattern):
+                return index
+        return -1
+
+    def test_first_match_wins(self):
+        things = [
+            ('connect', 'a', 'b', 1), ('forget', 'a'), ('forget', 1),
+            ('node_up', 'a'), ('other', 'a'), ('a', 'b', 'c'), ([], 1),
+            {'exit': 1, 'address': 2}, {'response': 'a', 'message': 1},
+            {'response': 'b', 'message': 1}, {'response': 'a'},
+            {'response': 'a', 'exception': 1},
+            {'response': 'b', 'invalid_method': 'x'},
+            {'response': [], 'message': 1}, [1, 2], ['x'], 5, 'x', None]
+        select = shape.compile_many(self.patterns)
+        for thing in things:
+            self.assertEquals(select(thing), self.first_match(thing), thing)
+
+    def test_no_match(self):
+        select = shape.compile_many(({'a': int}, ('b',)))
+        self.assertEquals(select({'b': 1}), -1)
+        self.assertEquals(select(('b', 1)), -1)
+        self.assertEquals(select(1), -1)
+
+    def test_cached(self):
+        self.assertTrue(shape.compile_many(self.patterns) is
+                        shape.compile_many(self.patterns))
+
+
+class TestRecords(unittest.TestCase):
+    mode = 'static'
+
+    def test_class(self):
+        self.assertTrue(shape.is_shaped(Move('pawn', 1), Move))
+        self.assertTrue(shape.is_shaped(Capture('pawn', 1, 2), Move))
+        self.assertFalse(shape.is_shaped({'piece': 'pawn', 'to': 1}, Move))
+
+    def test_pattern(self):
+        pattern = Move.pattern(piece='pawn')
+        for thing, shaped in ((Move('pawn', (1, 2)), True),
+                              (Move('rook', (1, 2)), False),
+                              (Move('pawn', (1, 'x')), False),
+                              (Capture('pawn', (1, 2), 'rook'), True),
+                              (('pawn', (1, 2)), False)):
+            self.assertEquals(shape.is_shaped(thing, pattern), shaped)
+            self.assertEquals(shape.compile(pattern)(thing), shaped)
+
+    def test_compile_many(self):
+        patterns = (Capture, Move.pattern(piece='pawn'), Move, object)
+        select = shape.compile_many(patterns)
+        self.assertEquals(select(Move('pawn', (1, 2))), 1)
+        self.assertEquals(select(Move('rook', (1, 2))), 2)
+        self.assertEquals(select(Capture('pawn', (1, 2), 'x')), 0)
+        self.assertEquals(select({'piece': 'pawn'}), 3)
+
+
 class TestMakeShape(unittest.TestCase):
     mode = 'static'
     def test_simple(self):
@@ -184,6 +290,11 @@ class TestMakeShape(unittest.TestCase):
                 'baz': ({'bamf': 'hello'}, 5)}),
             {'foo': [{'bar': int}], 'baz': ({'bamf': str}, int)}) 
 
+    def test_record(self):
+        self.assertEquals(
+            shape.calculate_shape(Move('pawn', (1, 2))),
+            Move(str, (int, int)))
+
     def test_malformed(self):
         self.assertRaises(
             shape.AmbiguousShape,
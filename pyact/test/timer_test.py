@@ -0,0 +1,147 @@
+"""\
+Copyright (c) 2009, Donovan Preston.
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import unittest
+
+from pyact import timer
+
+
+class Clock(object):
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimerWheel(unittest.TestCase):
+    mode = 'static'
+
+    def setUp(self):
+        self.clock = Clock()
+        self.wheel = timer.TimerWheel(resolution=0.01, clock=self.clock)
+        self.fired = []
+
+    def run_until(self, until, step=0.01):
+        while self.clock.now < until:
+            self.clock.now += step
+            for expired in self.wheel.advance():
+                expired.fire()
+
+    def test_expires_in_order(self):
+        for delay in (0.5, 0.05, 3.0, 700.0, 0.01):
+            self.wheel.call_later(delay, self.fired.append, delay)
+        self.assertEquals(len(self.wheel), 5)
+        self.run_until(1000.0 + 1000.0, step=0.05)
+        self.assertEquals(self.fired, [0.01, 0.05, 0.5, 3.0, 700.0])
+        self.assertEquals(len(self.wheel), 0)
+
+    def test_never_early(self):
+        deadlines = []
+        def check(deadline):
+            self.assertTrue(self.clock.now >= deadline - 1e-9)
+            deadlines.append(deadline)
+        for delay in (0.013, 2.56, 2.57, 163.84, 200.0):
+            self.wheel.call_later(delay, check, self.clock.now + delay)
+        self.run_until(1300.0, step=0.003)
+        self.assertEquals(len(deadlines), 5)
+
+    def test_cancel(self):
+        first = self.wheel.call_later(0.1, self.fired.append, 1)
+        self.wheel.call_later(0.1, self.fired.append, 2)
+        far = self.wheel.call_later(100.0, self.fired.append, 3)
+        first.cancel()
+        far.cancel()
+        far.cancel()
+        self.assertFalse(first.pending)
+        self.assertEquals(len(self.wheel), 1)
+        self.run_until(1200.0, step=0.1)
+        self.assertEquals(self.fired, [2])
+
+    def test_batches_same_tick(self):
+        for i in range(3):
+            self.wheel.call_later(0.05, self.fired.append, i)
+        self.clock.now += 0.06
+        expired = self.wheel.advance()
+        self.assertEquals(sorted(t.args[0] for t in expired), [0, 1, 2])
+
+    def test_idle_wheel(self):
+        self.clock.now += 86400
+        self.wheel.call_later(0.02, self.fired.append, 1)
+        self.run_until(self.clock.now + 0.05)
+        self.assertEquals(self.fired, [1])
+
+    def test_beyond_range(self):
+        self.wheel.call_later(30 * 86400, self.fired.append, 1)
+        self.run_until(1000.0 + 29 * 86400, step=50.0)
+        self.assertEquals(self.fired, [])
+        self.run_until(1000.0 + 30 * 86400 + 1, step=0.5)
+        self.assertEquals(self.fired, [1])
+
+    def test_next_expiry(self):
+        self.assertEquals(self.wheel.next_expiry(), None)
+        deadlines = []
+        def check(deadline):
+            self.assertTrue(self.clock.now >= deadline - 1e-9)
+            deadlines.append(deadline)
+        for delay in (0.013, 2.56, 2.57, 163.84, 200.0, 3600.0):
+            self.wheel.call_later(delay, check, self.clock.now + delay)
+        steps = 0
+        while self.wheel:
+            self.clock.now = max(self.clock.now, self.wheel.next_expiry())
+            for expired in self.wheel.advance():
+                expired.fire()
+            steps += 1
+        self.assertEquals(deadlines, sorted(deadlines))
+        self.assertEquals(len(deadlines), 6)
+        self.assertTrue(steps < 20, steps)
+
+    def test_call_every(self):
+        periodic = self.wheel.call_every(0.1, lambda: self.fired.append(
+                self.clock.now))
+        self.run_until(1000.0 + 0.55)
+        self.assertEquals(len(self.fired), 5)
+        periodic.cancel()
+        self.assertFalse(periodic.pending)
+        self.assertEquals(len(self.wheel), 0)
+        self.run_until(1000.0 + 1.0)
+        self.assertEquals(len(self.fired), 5)
+
+    def test_call_every_skips_missed(self):
+        self.wheel.call_every(0.1, self.fired.append, 1)
+        self.clock.now += 0.55
+        for expired in self.wheel.advance():
+            expired.fire()
+        self.assertEquals(self.fired, [1])
+        self.run_until(self.clock.now + 0.1)
+        self.assertEquals(self.fired, [1, 1])
+
+    def test_call_every_cancel_from_callback(self):
+        def callback():
+            self.fired.append(1)
+            periodic.cancel()
+        periodic = self.wheel.call_every(0.1, callback)
+        self.run_until(1000.0 + 0.5)
+        self.assertEquals(self.fired, [1])
+        self.assertEquals(len(self.wheel), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,260 @@
+# Copyright (c) 2012, Johan Rydberg
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Hierarchical timer wheel.
+
+A node serves all timers of its actors from one wheel, so arming and
+cancelling a timer is a set operation rather than a new event loop
+timer.
+"""
+
+import math
+import time
+
+
+# Number of bits of the tick counter covered by each level of the
+# wheel.  With the default resolution the wheel spans about 7.7 days;
+# timers further out are parked in the last level until they come
+# within range.
+LEVEL_BITS = (8, 6, 6, 6)
+
+
+class Timer(object):
+    """A callback scheduled on a L{TimerWheel}."""
+
+    __slots__ = ('expires', 'callback', 'args', '_slot', '_level', '_wheel')
+
+    def __init__(self, wheel, expires, callback, args):
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        self._slot = None
+        self._level = None
+        self._wheel = wheel
+
+    pending = property(lambda self: self._slot is not None)
+
+    def cancel(self):
+        """Cancel the timer if it has not expired yet."""
+        if self._slot is not None:
+            self._slot.discard(self)
+            self._slot = None
+            self._wheel._count -= 1
+            self._wheel._counts[self._level] -= 1
+
+    def fire(self):
+        """Call the callback of an expired timer."""
+        return self.callback(*self.args)
+
+
+class Periodic(object):
+    """A callback repeated every C{interval} seconds on a L{TimerWheel}.
+
+    Deadlines follow a fixed schedule, so a late tick does not make
+    the following ones drift.  Deadlines that were missed altogether
+    are skipped rather than fired in a burst.
+    """
+
+    __slots__ = ('interval', 'callback', 'args', '_wheel', '_timer', '_next')
+
+    def __init__(self, wheel, interval, callback, args):
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self._wheel = wheel
+        self._next = wheel.clock() + interval
+        self._timer = wheel.call_at(self._next, self._fire)
+
+    pending = property(lambda self: self._timer is not None)
+
+    def cancel(self):
+        """Stop repeating the callback."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _fire(self):
+        now = self._wheel.clock()
+        self._next += self.interval
+        if self._next <= now:
+            self._next += (int((now - self._next) / self.interval) + 1
+                           ) * self.interval
+        # Re-arm first so that the callback may cancel us.
+        self._timer = self._wheel.call_at(self._next, self._fire)
+        return self.callback(*self.args)
+
+
+class TimerWheel(object):
+    """A hierarchical timer wheel with a fixed tick resolution.
+
+    Timers never expire early; they expire on the first tick at or
+    after their deadline.  The wheel does not keep time itself, the
+    owner calls L{advance} by the time L{next_expiry} returns while
+    there are pending timers.
+    """
+
+    def __init__(self, resolution=0.01, clock=time.time):
+        self.resolution = resolution
+        self.clock = clock
+        self._tick = int(clock() / resolution)
+        self._count = 0
+        # Number of timers held by each level.
+        self._counts = [0] * len(LEVEL_BITS)
+        self._levels = [[set() for i in xrange(1 << bits)]
+                        for bits in LEVEL_BITS]
+
+    def __len__(self):
+        return self._count
+
+    def call_later(self, delay, callback, *args):
+        """Arrange for C{callback(*args)} to be called C{delay}
+        seconds from now.  Return a L{Timer}.
+        """
+        return self.call_at(self.clock() + delay, callback, *args)
+
+    def call_every(self, interval, callback, *args):
+        """Arrange for C{callback(*args)} to be called every
+        C{interval} seconds, starting C{interval} seconds from now.
+        Return a L{Periodic}.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive: %r" % (interval,))
+        return Periodic(self, interval, callback, args)
+
+    def call_at(self, when, callback, *args):
+        """Arrange for C{callback(*args)} to be called at the clock
+        time C{when}.  Return a L{Timer}.
+        """
+        if not self._count:
+            # Nothing has advanced the wheel while it was empty.
+            self._tick = max(self._tick,
+                             int(self.clock() / self.resolution))
+        expires = int(math.ceil(when / self.resolution))
+        timer = Timer(self, expires, callback, args)
+        self._insert(timer)
+        self._count += 1
+        return timer
+
+    def _insert(self, timer):
+        expires = max(timer.expires, self._tick)
+        delta = expires - self._tick
+        shift = 0
+        for number, bits in enumerate(LEVEL_BITS):
+            if delta < 1 << (shift + bits):
+                break
+            shift += bits
+        else:
+            expires = self._tick + (1 << shift) - 1
+            shift -= bits
+        slot = self._levels[number][(expires >> shift) & ((1 << bits) - 1)]
+        slot.add(timer)
+        timer._slot = slot
+        timer._level = number
+        self._counts[number] += 1
+
+    def _cascade(self, tick):
+        """Move the timers of the outer levels that come within range
+        of the inner level at this tick.
+        """
+        shift = LEVEL_BITS[0]
+        for number in xrange(1, len(LEVEL_BITS)):
+            bits = LEVEL_BITS[number]
+            index = (tick >> shift) & ((1 << bits) - 1)
+            slot = self._levels[number][index]
+            timers = list(slot)
+            slot.clear()
+            self._counts[number] -= len(timers)
+            for timer in timers:
+                self._insert(timer)
+            if index:
+                break
+            shift += bits
+
+    def next_expiry(self):
+        """Return the clock time the wheel should next be advanced to,
+        or None if there are no pending timers.
+
+        This is the next tick at which timers expire, or at which
+        timers of an outer level are cascaded, so a far away timer
+        takes a few such steps, one per level, but none is ever passed
+        over.
+        """
+        if not self._count:
+            return None
+        shift = 0
+        for number, bits in enumerate(LEVEL_BITS):
+            if self._counts[number]:
+                break
+            shift += bits
+        # Only the innermost level holding timers matters; the ones
+        # further out are not cascaded before it wraps around.  Scan
+        # its slots, in units of its ticks, up to the wrap.
+        slots = self._levels[number]
+        mask = len(slots) - 1
+        first = -(-self._tick >> shift)
+        wrap = -(-first >> bits) << bits
+        for each in xrange(first, wrap):
+            if slots[each & mask]:
+                wrap = each
+                break
+        # Nudged into the tick, so that advancing to the returned time
+        # reaches it despite rounding.
+        return ((wrap << shift) + 0.001) * self.resolution
+
+    def advance(self, now=None):
+        """Move the wheel forward to C{now} and return the timers
+        that expired, in order of expiry.  The caller is expected to
+        call L{Timer.fire} on them.
+        """
+        if now is None:
+            now = self.clock()
+        target = int(now / self.resolution)
+        expired = []
+        wheel = self._levels[0]
+        mask = len(wheel) - 1
+        while self._tick <= target and self._count:
+            tick = self._tick
+            index = tick & mask
+            if not index:
+                self._cascade(tick)
+            if not self._counts[0]:
+                # Nothing can expire before the next cascade of the
+                # first level that holds timers.
+                shift = 0
+                for count, bits in zip(self._counts, LEVEL_BITS):
+                    if count:
+                        break
+                    shift += bits
+                self._tick = min(target + 1, ((tick >> shift) + 1) << shift)
+                continue
+            slot = wheel[index]
+            if slot:
+                for timer in slot:
+                    timer._slot = None
+                expired.extend(slot)
+                self._count -= len(slot)
+                self._counts[0] -= len(slot)
+                slot.clear()
+            self._tick = tick + 1
+        if not self._count:
+            self._tick = max(self._tick, target + 1)
+        return expired
@@ -157,7 +157,7 @@ def _remote_handle_custom(obj):
     Binary or other objects.
     """
     if isinstance(obj, actor.Address):
-        return {'address': local_address + obj.actor_id}
+        return {'address': local_address + str(obj.actor_id)}
     return actor.handle_custom(obj)
     
 